@@ -0,0 +1,142 @@
+import struct
+import sys
+from array import array
+
+# Serato BeatGrid payload: version (2 bytes), marker count (u32), then 8 bytes
+# per marker, all big-endian:
+#   non-terminal marker: position (f32 seconds), beats till the next marker (u32)
+#   terminal marker:     position (f32 seconds), BPM (f32)
+# followed by one footer byte.
+HEADER = struct.Struct(">BBI")
+MARKER_SIZE = 8
+
+# numpy only pays off for long grids (live-drummer tracks with hundreds of
+# markers); the usual single-marker grid is faster with plain floats. It takes
+# longer to import than the rest of the converter, so it is only imported for
+# the first such grid.
+NUMPY_MIN_MARKERS = 64
+
+numpy = None
+numpy_checked = False
+
+LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+def load_numpy():
+    # numpy, or None when it is not installed
+    global numpy, numpy_checked
+
+    if not numpy_checked:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        numpy_checked = True
+
+    return numpy
+
+
+class Beatgrid:
+    # One track's grid in two flat arrays instead of a dict per marker:
+    # positions of all markers (terminal last), beat counts of the non-terminal
+    # markers, and the terminal BPM (None for a track without a grid).
+    __slots__ = ("positions", "beats", "terminal_bpm")
+
+    def __init__(self, positions=None, beats=None, terminal_bpm=None):
+        self.positions = positions if positions is not None else array("f")
+        self.beats = beats if beats is not None else array("I")
+        self.terminal_bpm = terminal_bpm
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __eq__(self, other):
+        return (isinstance(other, Beatgrid) and self.positions == other.positions
+                and self.beats == other.beats and self.terminal_bpm == other.terminal_bpm)
+
+    def __repr__(self):
+        return f"Beatgrid({list(self.positions)!r}, {list(self.beats)!r}, {self.terminal_bpm!r})"
+
+    def __getstate__(self):
+        return self.positions, self.beats, self.terminal_bpm
+
+    def __setstate__(self, state):
+        self.positions, self.beats, self.terminal_bpm = state
+
+    def to_json(self):
+        # float32 values survive the trip through JSON's doubles exactly
+        return {"positions": self.positions.tolist(), "beats": self.beats.tolist(), "bpm": self.terminal_bpm}
+
+    @classmethod
+    def from_json(cls, value):
+        return cls(array("f", value["positions"]), array("I", value["beats"]), value["bpm"])
+
+    def segments(self, default_bpm, offsets=()):
+        # (positions, BPMs) of the TEMPO entries: a segment's BPM is its beat
+        # count over its duration, the terminal marker keeps its own BPM, and
+        # a zero-length segment falls back to the track BPM. The offsets are
+        # added to every position in turn. Without a terminal marker the grid
+        # is a single segment at 0 with the track BPM.
+        if self.terminal_bpm is None:
+            positions = [0.0]
+            for offset in offsets:
+                positions = [position + offset for position in positions]
+            return positions, [default_bpm]
+
+        if len(self.positions) >= NUMPY_MIN_MARKERS and load_numpy() is not None:
+            return self._segments_numpy(default_bpm, offsets)
+
+        positions = self.positions.tolist()
+        bpms = [beats * 60.0 / duration if duration > 0 else default_bpm
+                for beats, duration in zip(self.beats, [b - a for a, b in zip(positions, positions[1:])])]
+        bpms.append(self.terminal_bpm)
+
+        for offset in offsets:
+            positions = [position + offset for position in positions]
+
+        return positions, bpms
+
+    def _segments_numpy(self, default_bpm, offsets):
+        positions = numpy.frombuffer(self.positions, dtype=numpy.float32).astype(numpy.float64)
+        beats = numpy.frombuffer(self.beats, dtype=numpy.uint32).astype(numpy.float64)
+        durations = numpy.diff(positions)
+
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            bpms = numpy.where(durations > 0, beats * 60.0 / durations, default_bpm)
+
+        for offset in offsets:
+            positions = positions + offset
+
+        return positions.tolist(), bpms.tolist() + [self.terminal_bpm]
+
+
+def decode_markers(block, count):
+    # Decodes count big-endian markers from the start of block in one go:
+    # the 8-byte records are read as a flat array of 32-bit words, whose even
+    # entries are the float positions and odd entries the beat counts (the
+    # last one being the terminal BPM's float bits).
+    if count == 0:
+        return Beatgrid()
+
+    size = count * MARKER_SIZE
+    if len(block) < size:
+        raise ValueError(f"BeatGrid data is truncated: {count} markers need {size} bytes, got {len(block)}")
+
+    words = array("I", bytes(block[:size]))
+    if LITTLE_ENDIAN:
+        words.byteswap()
+
+    positions = array("f", words[0::2].tobytes())
+    beats = words[1:-1:2]
+    terminal_bpm = array("f", words[-1:].tobytes())[0]
+
+    return Beatgrid(positions, beats, terminal_bpm)
+
+
+def parse_payload(data):
+    # -> (version, marker count, Beatgrid) for a whole BeatGrid payload.
+    if len(data) < HEADER.size:
+        raise ValueError("Not enough data for BeatGrid header.")
+
+    major, minor, count = HEADER.unpack_from(data)
+    return (major, minor), count, decode_markers(memoryview(data)[HEADER.size:], count)
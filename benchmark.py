@@ -0,0 +1,223 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from synthetic_library import generate_library
+
+# End-to-end benchmark: builds synthetic libraries of increasing size and runs
+# the four conversion stages on each one in a fresh child process, so every
+# size gets its own peak RSS. Results are printed as a table and can be saved
+# as JSON and compared against an earlier run to catch regressions.
+#
+# --orders runs every size once per stage 2 read order, and --cold drops the
+# library from the page cache before each run, so the effect of the order on
+# disk access shows up the way it does on a real drive.
+
+DEFAULT_SIZES = "1000,10000,100000"
+STAGES = ("crates", "tracks", "playlists", "xml")
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    usage = max(usage, children)
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
+
+
+def run_stages(serato_folder, output_path, workers=1, use_database=False, order="crate"):
+    # Runs in the child process. Imported here so the parent's RSS and import
+    # time never leak into the measurement.
+    import serato2rekordbox as converter
+
+    timings = {}
+
+    start = time.perf_counter()
+    crate_paths = converter.find_serato_crates(os.path.join(serato_folder, "subcrates"))
+    crate_index, _, _ = converter.read_crates(crate_paths)
+    timings["crates"] = time.perf_counter() - start
+
+    # stage 2 also serializes the collection, which stage 4 then only assembles
+    start = time.perf_counter()
+    database = converter.load_database(serato_folder) if use_database else {}
+    tracks = converter.collection_spool()
+    converter.convert_tracks(crate_index.track_paths, tracks, workers, database=database, order=order)
+    timings["tracks"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    playlists = converter.structure_playlists(crate_index, tracks)
+    timings["playlists"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    converter.generate_rekordbox_xml(playlists, crate_index, tracks, output_path=output_path)
+    timings["xml"] = time.perf_counter() - start
+    tracks.close()
+
+    return {
+        "tracks": len(crate_index),
+        "order": order,
+        "converted": len(tracks),
+        "crates": len(crate_paths),
+        "stages": timings,
+        "total": sum(timings.values()),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def evict_page_cache(root):
+    # Asks the kernel to drop the cached pages of every file in the library,
+    # which works without root, unlike writing to /proc/sys/vm/drop_caches.
+    for folder, _, files in os.walk(root):
+        for name in files:
+            try:
+                fd = os.open(os.path.join(folder, name), os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+
+
+def run_child(serato_folder, output_path, workers, use_database, order):
+    command = [sys.executable, os.path.abspath(__file__), "--child", serato_folder,
+               "--child-output", output_path, "--workers", str(workers), "--orders", order]
+    if use_database:
+        command.append("--use-database")
+
+    completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                               text=True, check=True)
+    # the converter prints progress to stdout as well; the result is the last line
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def library_for(size, args):
+    # Crates hold absolute paths, so the library is generated in place; the
+    # marker file tells a complete library from an interrupted one.
+    root = os.path.abspath(os.path.join(args.workdir, f"library-{size}-seed{args.seed}-art{args.art_size}"))
+    serato_folder = os.path.join(root, "_Serato_")
+    marker = os.path.join(root, ".complete")
+
+    if not os.path.exists(marker):
+        shutil.rmtree(root, ignore_errors=True)
+        print(f"Generating a synthetic library with {size} tracks in {root} ...", flush=True)
+        start = time.perf_counter()
+        generate_library(root, size, seed=args.seed, art_size=args.art_size)
+        open(marker, "w").close()
+        print(f"  generated in {time.perf_counter() - start:.1f}s", flush=True)
+
+    return root, serato_folder
+
+
+def result_key(result):
+    return f"{result['tracks']}/{result.get('order', 'crate')}"
+
+
+def print_table(results, baseline=None):
+    header = f"{'tracks':>8} {'ok':>8} {'order':>7} " + " ".join(f"{stage + ' s':>11}" for stage in STAGES) + f" {'total s':>9} {'tracks/s':>9} {'peak RSS':>10}"
+    print("\n" + header)
+    print("-" * len(header))
+
+    for result in results:
+        rss = result["peak_rss_mb"]
+        rate = result["tracks"] / result["total"] if result["total"] else 0
+        print(f"{result['tracks']:>8} {result['converted']:>8} {result.get('order', 'crate'):>7} "
+              + " ".join(f"{result['stages'][stage]:>11.3f}" for stage in STAGES)
+              + f" {result['total']:>9.3f} {rate:>9.0f} {(f'{rss:.0f} MB' if rss is not None else 'n/a'):>10}")
+
+        previous = (baseline or {}).get(result_key(result))
+        if previous:
+            ratios = [result["stages"][stage] / previous["stages"][stage] if previous["stages"][stage] else 0
+                      for stage in STAGES]
+            total_ratio = result["total"] / previous["total"] if previous["total"] else 0
+            print(f"{'vs base':>25} " + " ".join(f"{ratio:>10.2f}x" for ratio in ratios) + f" {total_ratio:>8.2f}x")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end scaling benchmark for serato2rekordbox on synthetic libraries.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help=f"comma separated library sizes in tracks (default: {DEFAULT_SIZES})")
+    parser.add_argument("--workdir", default=None,
+                        help="where libraries are generated and kept between runs (default: a temporary folder that is removed afterwards)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--art-size", type=int, default=8 * 1024,
+                        help="bytes of cover art in every file's tags (default: 8192)")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="worker processes for track extraction (default: 1)")
+    parser.add_argument("--use-database", action="store_true",
+                        help="take metadata from the generated database V2 file")
+    parser.add_argument("--orders", default="crate",
+                        help="comma separated stage 2 read orders to run every size with: crate, path, inode, extent (default: crate)")
+    parser.add_argument("--cold", action="store_true",
+                        help="drop the library from the page cache before every run (Linux)")
+    parser.add_argument("--json", dest="json_path",
+                        help="save the results to this JSON file")
+    parser.add_argument("--compare",
+                        help="JSON file from an earlier run to compare the stage times against")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--child-output", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_stages(args.child, args.child_output, args.workers, args.use_database, args.orders)))
+        return
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    orders = [order.strip() for order in args.orders.split(",") if order.strip()]
+
+    if args.cold and not hasattr(os, "posix_fadvise"):
+        print("⚠️ --cold is not supported on this platform, running with a warm cache.")
+        args.cold = False
+    keep_workdir = args.workdir is not None
+    args.workdir = args.workdir or tempfile.mkdtemp(prefix="serato2rekordbox-bench-")
+    os.makedirs(args.workdir, exist_ok=True)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = {result_key(result): result for result in json.load(f)["results"]}
+
+    results = []
+    try:
+        for size in sizes:
+            root, serato_folder = library_for(size, args)
+
+            for order in orders:
+                if args.cold:
+                    evict_page_cache(root)
+
+                print(f"Converting {size} tracks ({order} order{', cold cache' if args.cold else ''}) ...", flush=True)
+                results.append(run_child(serato_folder, os.path.join(root, "serato2rekordbox.xml"),
+                                         args.workers, args.use_database, order))
+    finally:
+        if not keep_workdir:
+            shutil.rmtree(args.workdir, ignore_errors=True)
+
+    print_table(results, baseline)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"created": time.time(), "workers": args.workers, "use_database": args.use_database, "cold": args.cold,
+                       "art_size": args.art_size, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import os
+import platform
+from collections import namedtuple
+
+# track_ids are positions in CrateIndex.track_paths, in crate order
+Crate = namedtuple("Crate", ["path", "name", "track_ids"])
+
+
+def format_crate_name(crate_file_path):
+    # "Parent%%Child%%Grandchild.crate" -> "Parent [Child] [Grandchild]"
+    raw_name = os.path.basename(crate_file_path)[:-6]
+    segments = raw_name.split("%%")
+    return segments[0] + "".join(f" [{seg}]" for seg in segments[1:])
+
+
+def normalize_track_path(track_path):
+    # Crate paths use the volume-relative form Serato stores; on macOS/Linux
+    # they are missing the leading separator.
+    normalized = track_path.replace('\\', os.sep)
+
+    if platform.system() != "Windows" and not normalized.startswith(os.sep):
+        normalized = os.sep + normalized
+
+    return normalized
+
+
+class CrateIndex:
+    # Built once in stage 1 and shared by playlist structuring, XML generation
+    # and the error report, so no crate file is ever parsed twice.
+
+    def __init__(self):
+        self.crates = []
+        self.track_paths = []
+        self.track_ids = {}
+        self.track_crates = []
+
+    def add_crate(self, crate_file_path, paths_in_crate):
+        crate_number = len(self.crates)
+        ids = []
+
+        for track_path in paths_in_crate:
+            lookup_path = normalize_track_path(track_path)
+            track_id = self.track_ids.get(lookup_path)
+
+            if track_id is None:
+                track_id = len(self.track_paths)
+                self.track_ids[lookup_path] = track_id
+                self.track_paths.append(lookup_path)
+                self.track_crates.append([])
+
+            ids.append(track_id)
+            self.track_crates[track_id].append(crate_number)
+
+        crate = Crate(crate_file_path, format_crate_name(crate_file_path), ids)
+        self.crates.append(crate)
+        return crate
+
+    def select(self, keep):
+        # A new index with only the tracks for which keep(path) is true. Crates
+        # keep their order and may end up empty; playlists skip those. Aliases
+        # of kept tracks (see remap()) still resolve to them.
+        selected = CrateIndex()
+        kept = [keep(path) for path in self.track_paths]
+
+        for crate in self.crates:
+            selected.add_crate(crate.path, [self.track_paths[i] for i in crate.track_ids if kept[i]])
+
+        for path, track_id in self.track_ids.items():
+            if kept[track_id]:
+                selected.track_ids.setdefault(path, selected.track_ids[self.track_paths[track_id]])
+
+        return selected
+
+    def merge_duplicates(self, identities):
+        # A new index in which paths with the same identity (see file_identity)
+        # are one track, kept under the spelling that comes first in crate
+        # order.
+        first_path = {}
+        return self.remap({path: first_path.setdefault(identities[path], path) for path in self.track_paths})
+
+    def remap(self, new_paths):
+        # A new index with every track path replaced by new_paths[path]; paths
+        # that end up equal are one track. The old paths (and the aliases this
+        # index already had) still resolve to their track, and a crate that
+        # lists one file twice keeps only its first entry.
+        remapped = CrateIndex()
+
+        for crate in self.crates:
+            paths = dict.fromkeys(new_paths[self.track_paths[i]] for i in crate.track_ids)
+            remapped.add_crate(crate.path, list(paths))
+
+        for path, track_id in self.track_ids.items():
+            remapped.track_ids.setdefault(path, remapped.track_ids[new_paths[self.track_paths[track_id]]])
+
+        return remapped
+
+    def crate_paths(self, crate):
+        return [self.track_paths[track_id] for track_id in crate.track_ids]
+
+    def crate_names_for(self, track_path):
+        track_id = self.track_ids.get(track_path)
+        if track_id is None:
+            return []
+
+        return [self.crates[n].name for n in self.track_crates[track_id]]
+
+    def __contains__(self, track_path):
+        return track_path in self.track_ids
+
+    def __len__(self):
+        return len(self.track_paths)
@@ -0,0 +1,79 @@
+import os
+import platform
+import unicodedata
+
+# Crates can reach one file through several spellings: different case on a
+# case-insensitive volume, NFC and NFD forms of the same name (macOS), a
+# symlinked folder, two mount points of one share. Identities tell those apart
+# from genuinely different files:
+#
+#   existing file   (st_dev, st_ino) of the file itself, symlinks followed
+#   missing file    ("path", canonical spelling), so spellings that differ
+#                   only in Unicode normalization (or case, where the OS
+#                   ignores it) are still reported once
+#
+# On POSIX a folder listing carries each file's inode, so a folder costs one
+# os.scandir() and one stat of the folder itself; only spellings the listing
+# does not contain verbatim (other case or normalization, symlinks) are
+# stat'ed one by one.
+
+LIST_FOLDERS = platform.system() != "Windows"    # inodes in Windows listings need a stat per entry
+
+
+def canonical_path(path):
+    return os.path.normcase(unicodedata.normalize("NFC", os.path.normpath(path)))
+
+
+def list_folder(folder, inodes=True):
+    # (st_dev of the folder, {name: inode, 0 for symlinks}), (None, {}) if the
+    # folder does not exist, or None if it cannot be listed. Without inodes
+    # every name maps to 0 (for path_resolver on Windows, where they cost a stat).
+    try:
+        device = os.stat(folder).st_dev
+        with os.scandir(folder) as entries:
+            if not inodes:
+                return device, dict.fromkeys((entry.name for entry in entries), 0)
+            names = {entry.name: 0 if entry.is_symlink() else entry.inode() for entry in entries}
+    except (FileNotFoundError, NotADirectoryError):
+        return None, {}
+    except OSError:
+        return None
+
+    return device, names
+
+
+def stat_identity(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    return (st.st_dev, st.st_ino) if st.st_ino else None
+
+
+def file_identities(paths, listings=None):
+    # path -> identity for every path; listings (folder -> list_folder()) may
+    # already hold the folders path_resolver has read
+    listings = {} if listings is None else listings
+    identities = {}
+
+    for path in paths:
+        identity = None
+
+        if LIST_FOLDERS:
+            folder, name = os.path.split(path)
+            if folder not in listings:
+                listings[folder] = list_folder(folder)
+
+            listing = listings[folder]
+            if listing is not None and listing[1].get(name):
+                identity = (listing[0], listing[1][name])
+            elif listing is not None and listing[0] is None:
+                identity = ("path", canonical_path(path))       # the folder is missing
+
+        if identity is None:
+            identity = stat_identity(path) or ("path", canonical_path(path))
+
+        identities[path] = identity
+
+    return identities
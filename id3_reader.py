@@ -0,0 +1,262 @@
+import re
+import struct
+
+# Frames the extractors actually use. Everything else (APIC cover art, the
+# multi-kilobyte "Serato Overview" waveform, ...) is skipped with a seek.
+TEXT_FRAMES = ("TIT2", "TPE1", "TBPM", "TKEY")
+GEOB_DESCRIPTIONS = ("Serato Markers2", "Serato BeatGrid")
+
+# Enough to cover a GEOB frame's encoding, MIME type, filename and description.
+GEOB_HEADER_PEEK = 256
+
+TEXT_ENCODINGS = {0: "latin-1", 1: "utf-16", 2: "utf-16-be", 3: "utf-8"}
+
+# v2.4 frame flags: grouping, compression, encryption, unsynchronisation, data length indicator
+V24_UNSUPPORTED_FRAME_FLAGS = 0x0040 | 0x0008 | 0x0004 | 0x0002 | 0x0001
+# v2.3 frame flags: compression, encryption, grouping
+V23_UNSUPPORTED_FRAME_FLAGS = 0x0080 | 0x0040 | 0x0020
+
+VALID_FRAME_ID = re.compile(rb"[A-Z0-9]{4}\Z")
+
+
+class UnsupportedTag(Exception):
+    # The tag uses a feature this reader deliberately leaves to mutagen
+    # (ID3v2.2, unsynchronisation, extended headers, compressed frames, ...).
+    pass
+
+
+class ID3Frames:
+    def __init__(self, version=None, size=0):
+        self.version = version
+        self.size = size            # tag size including the 10-byte header, like mutagen's ID3.size
+        self.text = {}              # frame id -> list of values
+        self.geob = {}              # GEOB description -> data
+
+    def first_text(self, frame_id, default=None):
+        values = self.text.get(frame_id)
+        return values[0] if values else default
+
+    def joined_text(self, frame_id, default=None):
+        # Same as str() of a mutagen text frame.
+        values = self.text.get(frame_id)
+        return "\x00".join(values) if values is not None else default
+
+    def add_text(self, frame_id, values):
+        # Repeated text frames are merged like mutagen does.
+        existing = self.text.setdefault(frame_id, [])
+        for value in values:
+            if value not in existing:
+                existing.append(value)
+
+
+def syncsafe(data):
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def find_terminator(data, encoding, start):
+    # Index of the string terminator for the given text encoding, or -1.
+    if encoding in (1, 2):
+        end = data.find(b"\x00\x00", start)
+        while end != -1 and (end - start) % 2:
+            end = data.find(b"\x00\x00", end + 1)
+        return end
+
+    return data.find(b"\x00", start)
+
+
+def terminator_length(encoding):
+    return 2 if encoding in (1, 2) else 1
+
+
+def decode_text_frame(payload):
+    if not payload:
+        return []
+
+    encoding = payload[0]
+    codec = TEXT_ENCODINGS.get(encoding)
+    if codec is None:
+        return None
+
+    values = []
+    offset = 1
+    while offset < len(payload):
+        end = find_terminator(payload, encoding, offset)
+        if end == -1:
+            values.append(payload[offset:].decode(codec, errors="replace"))
+            break
+
+        values.append(payload[offset:end].decode(codec, errors="replace"))
+        offset = end + terminator_length(encoding)
+
+    return values
+
+
+def parse_geob_header(payload):
+    # Returns (description, offset of the object data), or None if the
+    # header is not complete within payload.
+    if not payload:
+        return None
+
+    encoding = payload[0]
+    codec = TEXT_ENCODINGS.get(encoding)
+    if codec is None:
+        return None
+
+    mime_end = payload.find(b"\x00", 1)
+    if mime_end == -1:
+        return None
+
+    filename_end = find_terminator(payload, encoding, mime_end + 1)
+    if filename_end == -1:
+        return None
+
+    desc_start = filename_end + terminator_length(encoding)
+    desc_end = find_terminator(payload, encoding, desc_start)
+    if desc_end == -1:
+        return None
+
+    desc = payload[desc_start:desc_end].decode(codec, errors="replace")
+    return desc, desc_end + terminator_length(encoding)
+
+
+def read_id3(fileobj, offset=0, text_frames=TEXT_FRAMES, geob_descriptions=GEOB_DESCRIPTIONS):
+    # Reads only the wanted frames of the ID3v2 tag starting at offset.
+    # Returns None if there is no ID3v2 tag there; raises UnsupportedTag for
+    # anything that should be left to mutagen.
+    fileobj.seek(offset)
+    header = fileobj.read(10)
+
+    if len(header) < 10 or header[:3] != b"ID3":
+        return None
+
+    major, flags = header[3], header[5]
+    if major not in (3, 4):
+        raise UnsupportedTag(f"ID3v2.{major}")
+
+    if flags & 0x80:
+        raise UnsupportedTag("unsynchronised tag")
+
+    if flags & 0x40:
+        raise UnsupportedTag("extended header")
+
+    if any(b & 0x80 for b in header[6:10]):
+        raise UnsupportedTag("tag size is not syncsafe")
+
+    tag_size = syncsafe(header[6:10])
+    frames = ID3Frames(version=(2, major, header[4]), size=tag_size + 10)
+    unsupported_flags = V24_UNSUPPORTED_FRAME_FLAGS if major == 4 else V23_UNSUPPORTED_FRAME_FLAGS
+
+    position = offset + 10
+    end = position + tag_size
+
+    if fileobj.seek(0, 2) < end:
+        raise UnsupportedTag("tag is truncated")
+
+    while position + 10 <= end:
+        fileobj.seek(position)
+        frame_header = fileobj.read(10)
+        if len(frame_header) < 10:
+            raise UnsupportedTag("tag is truncated")
+
+        frame_id = frame_header[:4]
+        if frame_id == b"\x00\x00\x00\x00":
+            break  # padding
+
+        if not VALID_FRAME_ID.match(frame_id):
+            # Usually a v2.4 tag written with plain (non-syncsafe) frame sizes;
+            # mutagen knows how to recover from that.
+            raise UnsupportedTag(f"invalid frame id {frame_id!r}")
+
+        if major == 4:
+            if any(b & 0x80 for b in frame_header[4:8]):
+                raise UnsupportedTag("frame size is not syncsafe")
+            size = syncsafe(frame_header[4:8])
+        else:
+            size = struct.unpack(">I", frame_header[4:8])[0]
+
+        frame_flags = struct.unpack(">H", frame_header[8:10])[0]
+        data_start = position + 10
+        position = data_start + size
+
+        if position > end:
+            raise UnsupportedTag("frame runs past the end of the tag")
+
+        if size == 0:
+            continue
+
+        name = frame_id.decode("ascii")
+
+        if name in text_frames:
+            if frame_flags & unsupported_flags:
+                raise UnsupportedTag(f"{name} frame flags {frame_flags:#06x}")
+
+            values = decode_text_frame(fileobj.read(size))
+            if values is not None:
+                frames.add_text(name, values)
+
+        elif name == "GEOB" and geob_descriptions:
+            if frame_flags & unsupported_flags:
+                raise UnsupportedTag(f"GEOB frame flags {frame_flags:#06x}")
+
+            head = fileobj.read(min(size, GEOB_HEADER_PEEK))
+            parsed = parse_geob_header(head)
+
+            if parsed is None and len(head) < size:
+                head += fileobj.read(size - len(head))
+                parsed = parse_geob_header(head)
+
+            if parsed is None:
+                continue
+
+            desc, data_offset = parsed
+            if desc not in geob_descriptions:
+                continue
+
+            if len(head) < size:
+                head += fileobj.read(size - len(head))
+
+            # later frames with the same description replace earlier ones, as in mutagen
+            frames.geob[desc] = head[data_offset:]
+
+    return frames
+
+
+def read_id3v1(fileobj, frames):
+    # mutagen merges title/artist from a trailing ID3v1 tag into the ID3v2
+    # frames when they are missing there; do the same with one 128-byte read.
+    try:
+        fileobj.seek(-128, 2)
+    except OSError:
+        return frames
+
+    data = fileobj.read(128)
+    if len(data) < 128 or not data.startswith(b"TAG"):
+        return frames
+
+    if frames is None:
+        frames = ID3Frames(version=(1, 1), size=0)
+
+    for frame_id, raw in (("TIT2", data[3:33]), ("TPE1", data[33:63])):
+        value = raw.split(b"\x00")[0].strip().decode("latin-1")
+        if value and frame_id not in frames.text:
+            frames.text[frame_id] = [value]
+
+    return frames
+
+
+def frames_from_mutagen(tags, text_frames=TEXT_FRAMES, geob_descriptions=GEOB_DESCRIPTIONS):
+    # Converts a mutagen ID3 object into ID3Frames, for tags read through the fallback path.
+    size = getattr(tags, "size", 0)
+    frames = ID3Frames(version=getattr(tags, "version", None), size=size)
+
+    for frame_id in text_frames:
+        frame = tags.get(frame_id)
+        if frame is not None and hasattr(frame, "text"):
+            frames.text[frame_id] = [str(value) for value in frame.text]
+
+    for frame in tags.getall("GEOB"):
+        desc = getattr(frame, "desc", "")
+        if desc in geob_descriptions:
+            frames.geob[desc] = frame.data
+
+    return frames
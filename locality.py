@@ -0,0 +1,124 @@
+import errno
+import os
+import platform
+import struct
+
+import file_identity
+
+# Stage 2 reads tracks in crate order, which jumps all over the volume. These
+# orderings visit them the way they lie on disk instead; the caller still
+# reports results in crate order, so the output never depends on the order.
+#
+#   crate   crate order, as before
+#   path    grouped by folder, by file name within a folder
+#   inode   grouped by folder, by inode number within a folder; inodes are
+#           allocated roughly in disk order, and listing a folder is one call
+#   extent  by the physical offset of each file's first extent (Linux FIEMAP),
+#           falling back to inode order where the filesystem cannot tell
+ORDERS = ("crate", "path", "inode", "extent")
+DEFAULT_ORDER = "path" if platform.system() == "Windows" else "inode"
+
+FS_IOC_FIEMAP = 0xC020660B
+FIEMAP_HEADER = struct.Struct("=QQIIII")                 # fm_start, fm_length, fm_flags, fm_mapped_extents, fm_extent_count, fm_reserved
+FIEMAP_EXTENT = struct.Struct("=QQQQQIIII")              # fe_logical, fe_physical, fe_length, 2 x reserved, fe_flags, 3 x reserved
+FIEMAP_FLAG_SYNC = 0x1
+FIEMAP_UNSUPPORTED = (errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL)
+
+
+def directory_inodes(directories, listings=None):
+    # file path -> inode number. listings (folder -> file_identity.list_folder())
+    # may already hold the folders path_resolver read in stage 1; any other
+    # folder is listed once here. On POSIX the inode comes with the listing,
+    # so no file is stat'ed.
+    listings = {} if listings is None else listings
+    inodes = {}
+
+    for directory in directories:
+        listing = listings.get(directory)
+        if listing is None:
+            listing = listings[directory] = file_identity.list_folder(directory)
+            if listing is None:
+                continue
+
+        for name, inode in listing[1].items():
+            inodes[os.path.join(directory, name)] = inode
+
+    return inodes
+
+
+def first_extent(path, fcntl):
+    # Physical byte offset of the file's first extent, None if it has none
+    # (empty or inline files), or False if the filesystem does not support FIEMAP.
+    request = bytearray(FIEMAP_HEADER.size + FIEMAP_EXTENT.size)
+    FIEMAP_HEADER.pack_into(request, 0, 0, 0xFFFFFFFFFFFFFFFF, FIEMAP_FLAG_SYNC, 0, 1, 0)
+
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+
+    try:
+        fcntl.ioctl(fd, FS_IOC_FIEMAP, request)
+    except OSError as e:
+        return False if e.errno in FIEMAP_UNSUPPORTED else None
+    finally:
+        os.close(fd)
+
+    if FIEMAP_HEADER.unpack_from(request, 0)[3] == 0:
+        return None
+
+    return FIEMAP_EXTENT.unpack_from(request, FIEMAP_HEADER.size)[1]
+
+
+def extent_offsets(paths):
+    # path -> physical offset for every file the filesystem could place.
+    # Stops asking after the first "not supported" answer.
+    try:
+        import fcntl
+    except ImportError:   # Windows
+        return {}
+
+    if platform.system() != "Linux":
+        return {}
+
+    offsets = {}
+    for path in paths:
+        offset = first_extent(path, fcntl)
+        if offset is False:
+            break
+        if offset is not None:
+            offsets[path] = offset
+
+    return offsets
+
+
+def schedule(track_paths, order=DEFAULT_ORDER, listings=None):
+    # Indices into track_paths in the order the files should be read;
+    # listings as for directory_inodes().
+    indices = range(len(track_paths))
+
+    if order == "crate":
+        return list(indices)
+
+    split = [os.path.split(path) for path in track_paths]
+
+    if order == "path":
+        return sorted(indices, key=split.__getitem__)
+
+    if order not in ("inode", "extent"):
+        raise ValueError(f"unknown order {order!r}, expected one of {', '.join(ORDERS)}")
+
+    inodes = directory_inodes(sorted({directory for directory, _ in split}), listings)
+
+    def inode_key(i):
+        directory, name = split[i]
+        return directory, inodes.get(track_paths[i], 0), name
+
+    if order == "inode":
+        return sorted(indices, key=inode_key)
+
+    # files without a known extent go last, in inode order
+    offsets = extent_offsets(track_paths)
+    placed = sorted((i for i in indices if track_paths[i] in offsets), key=lambda i: (offsets[track_paths[i]], i))
+    rest = sorted((i for i in indices if track_paths[i] not in offsets), key=inode_key)
+    return placed + rest
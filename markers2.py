@@ -0,0 +1,169 @@
+import binascii
+import logging
+import struct
+
+from records import HotCue
+
+# Serato Markers2: base64 text (with line breaks and null padding) holding a
+# version (01 01) followed by entries of
+#   name (null-terminated ASCII), length (u32), data
+# all big-endian. The MP3 and WAV extractors get the GEOB object data, which
+# is the version bytes followed by that base64 text; MP4 files store the
+# whole GEOB body (MIME type, file name, description, data) base64-encoded
+# once more. Everything is decoded in one pass over the payload: entries are
+# located with bytes.find() and struct offsets, nothing is sliced off the
+# front of the remaining data.
+VERSION = b"\x01\x01"
+LENGTH = struct.Struct(">I")
+
+# CUE:  00, index, position (ms), 00 RR GG BB, 00 00, name
+CUE = struct.Struct(">xBII")
+CUE_NAME = 12
+# MP4 tags get the stricter checks the M4A extractor always made: the
+# reserved bytes (0, 6, 10 and 11) must be zero and the entry must have room
+# for the name's terminator; anything else is skipped as malformed.
+CUE_RESERVED = (0, 6, 10, 11)
+
+# LOOP: 00, index, start (ms), end (ms), FF FF FF FF, colour, 00, locked, name
+LOOP = struct.Struct(">xBII4xI")
+LOOP_LOCKED = 19
+LOOP_NAME = 20
+
+# COLOR: 00 RR GG BB (the track colour); BPMLOCK: one flag byte
+COLOR = struct.Struct(">I")
+RGB_MASK = 0xFFFFFF
+
+MP4_MIME = b"application/octet-stream\x00"
+MP4_DESCRIPTION = b"Serato Markers2\x00"
+
+BASE64_ALPHABET = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+NOT_BASE64 = bytes(sorted(set(range(256)) - set(BASE64_ALPHABET)))
+
+
+class Loop:
+    __slots__ = ("index", "start_ms", "end_ms", "name", "rgb", "locked")
+
+    def __init__(self, index, start_ms, end_ms, name, rgb, locked):
+        self.index = index
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.name = name
+        self.rgb = rgb              # 0xRRGGBB
+        self.locked = locked
+
+    def __repr__(self):
+        return f"Loop({self.index!r}, {self.start_ms!r}, {self.end_ms!r}, {self.name!r}, #{self.rgb:06X}, {self.locked!r})"
+
+
+class Markers2:
+    # Decoded entries: hot cues (records.HotCue), saved loops, the track
+    # colour (None if the tag has none) and the BPM lock flag (likewise).
+    __slots__ = ("cues", "loops", "color", "bpm_lock")
+
+    def __init__(self):
+        self.cues = []
+        self.loops = []
+        self.color = None
+        self.bpm_lock = None
+
+    def __repr__(self):
+        return f"Markers2(cues={self.cues!r}, loops={self.loops!r}, color={self.color!r}, bpm_lock={self.bpm_lock!r})"
+
+
+def decode_base64(text):
+    # Drops everything outside the base64 alphabet (line breaks, padding,
+    # the version bytes, trailing nulls) in one translate() call, then cuts a
+    # lone last character, which cannot hold a whole byte, instead of retrying
+    # the decode one character shorter at a time.
+    if isinstance(text, str):
+        text = text.encode("utf-8")
+
+    clean = bytes(text).translate(None, NOT_BASE64)
+    if len(clean) % 4 == 1:
+        clean = clean[:-1]
+
+    return binascii.a2b_base64(clean + b"=" * (-len(clean) % 4))
+
+
+def read_string(data, start, end):
+    # null-terminated UTF-8 string in data[start:end]; unterminated runs to end
+    stop = data.find(b"\x00", start, end)
+    return data[start:end if stop == -1 else stop].decode("utf-8", errors="replace")
+
+
+def iter_entries(data):
+    # Yields (name, start, end) for every complete entry of a decoded payload;
+    # the entry data is data[start:end]. Stops at the first empty name (the
+    # null padding after the last entry) or at a truncated entry.
+    size = len(data)
+    position = len(VERSION) if data.startswith(VERSION) else 0
+
+    while position < size:
+        name_end = data.find(b"\x00", position)
+        if name_end <= position:
+            return
+
+        start = name_end + 1 + LENGTH.size
+        if start > size:
+            return
+
+        end = start + LENGTH.unpack_from(data, name_end + 1)[0]
+        if end > size:
+            return
+
+        yield data[position:name_end], start, end
+        position = end
+
+
+def valid_cue(data, start, end):
+    return end - start > CUE_NAME and not any(data[start + offset] for offset in CUE_RESERVED)
+
+
+def parse(data, strict_cues=False):
+    # decoded payload -> Markers2; unknown entries (FLIP, ...) are skipped
+    markers = Markers2()
+
+    for name, start, end in iter_entries(data):
+        if name == b"CUE":
+            if strict_cues and not valid_cue(data, start, end):
+                logging.warning("Skipping malformed CUE entry (%d bytes).", end - start)
+            elif end - start >= CUE_NAME:
+                index, position_ms, rgb = CUE.unpack_from(data, start)
+                markers.cues.append(HotCue(index, position_ms, read_string(data, start + CUE_NAME, end), rgb & RGB_MASK))
+
+        elif name == b"LOOP":
+            if end - start >= LOOP_NAME:
+                index, start_ms, end_ms, rgb = LOOP.unpack_from(data, start)
+                markers.loops.append(Loop(index, start_ms, end_ms, read_string(data, start + LOOP_NAME, end),
+                                          rgb & RGB_MASK, bool(data[start + LOOP_LOCKED])))
+
+        elif name == b"COLOR":
+            if end - start >= COLOR.size:
+                markers.color = COLOR.unpack_from(data, start)[0] & RGB_MASK
+
+        elif name == b"BPMLOCK":
+            if end > start:
+                markers.bpm_lock = bool(data[start])
+
+    return markers
+
+
+def from_geob(data, strict_cues=False):
+    # GEOB object data (ID3 tags of MP3 and WAV files) -> Markers2
+    return parse(decode_base64(data), strict_cues)
+
+
+def from_mp4(value):
+    # MP4 freeform value: a base64-encoded GEOB body -> Markers2
+    frame = decode_base64(value)
+    position = 0
+
+    if frame.startswith(MP4_MIME):
+        # MIME type, then the (empty) file name
+        filename_end = frame.find(b"\x00", len(MP4_MIME))
+        position = len(frame) if filename_end == -1 else filename_end + 1
+
+    if frame.startswith(MP4_DESCRIPTION, position):
+        position += len(MP4_DESCRIPTION)
+
+    return from_geob(memoryview(frame)[position:], strict_cues=True)
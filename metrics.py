@@ -0,0 +1,144 @@
+import heapq
+import io
+import json
+import os
+import time
+from contextlib import contextmanager
+
+METRICS_VERSION = 1
+DEFAULT_METRICS_FILE = "serato2rekordbox.metrics.json"
+SLOWEST_TRACKS = 20
+
+STAGES = ("crates", "tracks", "playlists", "xml")
+
+# Bytes handed to the extractors by the OS in this process. Extractors open
+# audio files with open_counted(), and process_track() takes the difference
+# around each extraction, so the count also works inside worker processes.
+bytes_read = 0
+
+
+class CountingFileIO(io.FileIO):
+    # Counts at the raw level, below the read buffer, so the numbers are what
+    # was actually requested from the disk rather than what the parsers asked for.
+
+    def readinto(self, buffer):
+        global bytes_read
+        count = super().readinto(buffer)
+        if count:
+            bytes_read += count
+        return count
+
+    def readall(self):
+        global bytes_read
+        data = super().readall()
+        bytes_read += len(data)
+        return data
+
+
+def open_counted(path, buffering=io.DEFAULT_BUFFER_SIZE):
+    # Drop-in replacement for open(path, "rb").
+    return io.BufferedReader(CountingFileIO(os.fspath(path), "r"), buffering)
+
+
+def cpu_time():
+    # Includes finished child processes, so pooled track extraction is counted
+    # once the workers have exited (always zero for children on Windows).
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+class StageMetrics:
+    def __init__(self, name):
+        self.name = name
+        self.wall_sec = 0.0
+        self.cpu_sec = 0.0
+        self.items = 0
+        self.extra = {}
+
+    def as_dict(self):
+        stage = {
+            "wall_sec": round(self.wall_sec, 6),
+            "cpu_sec": round(self.cpu_sec, 6),
+            "items": self.items,
+            "items_per_sec": round(self.items / self.wall_sec, 2) if self.wall_sec > 0 else None,
+        }
+        stage.update(self.extra)
+        return stage
+
+
+class RunMetrics:
+    # Collects per-stage timings and per-track extraction stats for one run.
+    # Stage 1 items are crate files, stage 2 tracks, stage 3 playlists and
+    # stage 4 tracks written to the collection.
+
+    def __init__(self, slowest=SLOWEST_TRACKS):
+        self.created = time.time()
+        self.stages = {name: StageMetrics(name) for name in STAGES}
+        self.formats = {}
+        self.slowest = slowest
+        self._slowest_heap = []
+        self._counter = 0
+
+    @contextmanager
+    def stage(self, name):
+        stage = self.stages[name]
+        wall, cpu = time.perf_counter(), cpu_time()
+
+        try:
+            yield stage
+        finally:
+            stage.wall_sec += time.perf_counter() - wall
+            stage.cpu_sec += cpu_time() - cpu
+
+    def add_track(self, path, stats):
+        # stats is the (extractor, seconds, bytes read) tuple of process_track(),
+        # or None for a track served from the cache.
+        extension = os.path.splitext(path)[1].lower() or "(none)"
+        fmt = self.formats.setdefault(extension, {"tracks": 0, "extracted": 0, "bytes_read": 0, "extract_sec": 0.0})
+        fmt["tracks"] += 1
+
+        if stats is None:
+            return
+
+        extractor, seconds, read = stats
+        fmt["extracted"] += 1
+        fmt["bytes_read"] += read
+        fmt["extract_sec"] += seconds
+
+        # bounded min-heap of the slowest extractions; the counter breaks ties
+        entry = (seconds, -self._counter, path, extractor, read)
+        self._counter += 1
+
+        if len(self._slowest_heap) < self.slowest:
+            heapq.heappush(self._slowest_heap, entry)
+        elif self.slowest:
+            heapq.heappushpop(self._slowest_heap, entry)
+
+    def slowest_tracks(self):
+        return [{"path": path, "extractor": extractor, "seconds": round(seconds, 6), "bytes_read": read}
+                for seconds, _, path, extractor, read in sorted(self._slowest_heap, reverse=True)]
+
+    def as_dict(self, **run_info):
+        formats = {
+            extension: dict(fmt, extract_sec=round(fmt["extract_sec"], 6))
+            for extension, fmt in sorted(self.formats.items())
+        }
+
+        return {
+            "version": METRICS_VERSION,
+            "created": self.created,
+            "run": run_info,
+            "total": {
+                "wall_sec": round(sum(stage.wall_sec for stage in self.stages.values()), 6),
+                "cpu_sec": round(sum(stage.cpu_sec for stage in self.stages.values()), 6),
+            },
+            "stages": {name: stage.as_dict() for name, stage in self.stages.items()},
+            "formats": formats,
+            "slowest_tracks": self.slowest_tracks(),
+        }
+
+    def save(self, metrics_path, **run_info):
+        tmp_path = metrics_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.as_dict(**run_info), f, indent=2)
+        os.replace(tmp_path, metrics_path)
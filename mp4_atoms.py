@@ -0,0 +1,419 @@
+import struct
+
+# Only moov/trak/mdia/minf/stbl and moov/udta/meta/ilst are descended into;
+# everything else (mdat, covr artwork, sample tables, ...) is skipped with a seek.
+
+# Bytes of version/flags in front of the children of a full-box container.
+CONTAINER_SKIP = {b"meta": 4}
+
+# ilst items read by default; freeform ("----") items are read when their mean
+# starts with one of FREEFORM_MEANS or when their full key is in FREEFORM_KEYS.
+TEXT_ATOMS = (b"\xa9nam", b"\xa9ART", b"\xa9key")
+# Text atoms mutagen also accepts with the implicit (0) data type; others must be UTF-8 (1).
+IMPLICIT_TEXT_ATOMS = (b"\xa9nam", b"\xa9ART")
+INTEGER_ATOMS = (b"tmpo",)
+FREEFORM_MEANS = ("com.serato",)
+FREEFORM_KEYS = ("----:com.mixedinkey:initialkey", "----:com.apple.iTunes:initialkey")
+
+# Enough to cover the mean and name children of a freeform item.
+FREEFORM_HEADER_PEEK = 256
+
+AAC_SAMPLE_RATES = [96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050, 16000, 12000, 11025, 8000, 7350]
+# AAC object types that may carry SBR (HE-AAC); see mutagen's DecoderSpecificInfo.
+SBR_CAPABLE_TYPES = (1, 2, 3, 4, 6, 17, 19, 20, 22)
+GA_SPECIFIC_TYPES = (1, 2, 3, 4, 6, 7, 17, 19, 20, 21, 22, 23)
+ER_TYPES = (17, 19, 20, 21, 22, 23, 24, 25, 26, 27, 39)
+
+
+class MP4Error(Exception):
+    pass
+
+
+class MP4Atoms:
+    def __init__(self):
+        self.tags = {}              # mutagen-style keys ("\xa9nam", "----:mean:name") -> list of values
+        self.length = 0.0           # seconds, from the audio track's mdhd (or mvhd)
+        self.sample_rate = 0        # Hz, 0 if unknown (same as mutagen's MP4Info)
+
+    def get(self, key, default=None):
+        return self.tags.get(key, default)
+
+
+def read_atom_header(fileobj, position, end):
+    # Returns (name, data offset, atom end) of the atom at position, or None
+    # at the end of the parent.
+    if position + 8 > end:
+        return None
+
+    fileobj.seek(position)
+    header = fileobj.read(8)
+    if len(header) < 8:
+        return None
+
+    length, name = struct.unpack(">I4s", header)
+    data_offset = position + 8
+
+    if length == 1:
+        extended = fileobj.read(8)
+        if len(extended) < 8:
+            raise MP4Error("truncated atom header")
+        length = struct.unpack(">Q", extended)[0]
+        data_offset += 8
+    elif length == 0:
+        length = end - position  # runs to the end of the parent (normally the file)
+
+    if length < data_offset - position:
+        raise MP4Error(f"invalid length for atom {name!r}")
+
+    return name, data_offset, position + length
+
+
+def iter_atoms(fileobj, start, end):
+    position = start
+    while True:
+        header = read_atom_header(fileobj, position, end)
+        if header is None:
+            return
+
+        name, data_offset, atom_end = header
+        yield name, data_offset, min(atom_end, end)
+        position = atom_end
+
+
+def read_payload(fileobj, data_offset, atom_end):
+    fileobj.seek(data_offset)
+    return fileobj.read(atom_end - data_offset)
+
+
+def iter_data_atoms(item, start=0):
+    # (version, flags, value) for each "data" child of an ilst item.
+    position = start
+    while position + 16 <= len(item):
+        length, name = struct.unpack_from(">I4s", item, position)
+        if name != b"data" or length < 16 or position + length > len(item):
+            raise MP4Error("malformed data atom")
+
+        version = item[position + 8]
+        flags = int.from_bytes(item[position + 9:position + 12], "big")
+        yield version, flags, item[position + 16:position + length]
+        position += length
+
+
+def parse_text_item(item, implicit=False):
+    values = []
+    for version, flags, value in iter_data_atoms(item):
+        if flags != 1 and not (implicit and flags == 0):
+            raise MP4Error("not a text atom")
+        values.append(value.decode("utf-8"))
+    return values
+
+
+def parse_integer_item(item):
+    values = []
+    for version, flags, value in iter_data_atoms(item):
+        if version != 0 or flags not in (0, 21) or len(value) not in (1, 2, 3, 4, 8):
+            raise MP4Error("unsupported integer atom")
+
+        number = int.from_bytes(value, "big", signed=True)
+        values.append(number)
+    return values
+
+
+def parse_freeform_header(item):
+    # Returns (mean, name, offset of the first data atom), or None if the
+    # mean/name atoms are not complete within item.
+    position = 0
+    parts = []
+
+    for expected in (b"mean", b"name"):
+        if position + 12 > len(item):
+            return None
+
+        length, name = struct.unpack_from(">I4s", item, position)
+        if name != expected or length < 12:
+            raise MP4Error("malformed freeform atom")
+
+        if position + length > len(item):
+            return None
+
+        parts.append(item[position + 12:position + length].decode("latin-1"))
+        position += length
+
+    return parts[0], parts[1], position
+
+
+def wants_freeform(mean, name):
+    return mean.startswith(FREEFORM_MEANS) or f"----:{mean}:{name}" in FREEFORM_KEYS
+
+
+def read_ilst(fileobj, start, end, tags):
+    for name, data_offset, atom_end in iter_atoms(fileobj, start, end):
+        try:
+            if name in TEXT_ATOMS:
+                values = parse_text_item(read_payload(fileobj, data_offset, atom_end), name in IMPLICIT_TEXT_ATOMS)
+
+            elif name in INTEGER_ATOMS:
+                values = parse_integer_item(read_payload(fileobj, data_offset, atom_end))
+
+            elif name == b"----":
+                size = atom_end - data_offset
+                fileobj.seek(data_offset)
+                item = fileobj.read(min(size, FREEFORM_HEADER_PEEK))
+                header = parse_freeform_header(item)
+
+                if header is None and len(item) < size:
+                    item += fileobj.read(size - len(item))
+                    header = parse_freeform_header(item)
+
+                if header is None:
+                    continue
+
+                mean, item_name, data_start = header
+                if not wants_freeform(mean, item_name):
+                    continue
+
+                if len(item) < size:
+                    item += fileobj.read(size - len(item))
+
+                values = [value for version, flags, value in iter_data_atoms(item, data_start)]
+                name = f"----:{mean}:{item_name}".encode("latin-1")
+
+            else:
+                continue
+
+        except (MP4Error, UnicodeDecodeError):
+            continue  # mutagen drops items it cannot parse as well
+
+        tags.setdefault(name.decode("latin-1"), []).extend(values)
+
+
+def parse_duration(payload):
+    # mvhd and mdhd share the layout up to the duration field.
+    version = payload[0]
+    if version == 0:
+        timescale, duration = struct.unpack_from(">2I", payload, 12)
+    elif version == 1:
+        timescale, duration = struct.unpack_from(">IQ", payload, 20)
+    else:
+        raise MP4Error(f"unknown header version {version}")
+
+    return duration / timescale if timescale else 0.0
+
+
+def read_descriptor_header(data, position):
+    tag = data[position]
+    position += 1
+    length = 0
+
+    for _ in range(4):
+        byte = data[position]
+        position += 1
+        length = (length << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            break
+
+    return tag, length, position
+
+
+class BitReader:
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+
+    def bits(self, count):
+        value = 0
+        for _ in range(count):
+            byte = self.data[self.position >> 3]
+            value = (value << 1) | ((byte >> (7 - (self.position & 7))) & 1)
+            self.position += 1
+        return value
+
+    def bits_left(self):
+        return len(self.data) * 8 - self.position
+
+
+def read_audio_object_type(r):
+    object_type = r.bits(5)
+    return 32 + r.bits(6) if object_type == 31 else object_type
+
+
+def read_sampling_frequency(r):
+    index = r.bits(4)
+    if index == 0xF:
+        return r.bits(24)
+    return AAC_SAMPLE_RATES[index] if index < len(AAC_SAMPLE_RATES) else 0
+
+
+def aac_sample_rate(config):
+    # Output sample rate from an AudioSpecificConfig, following mutagen's
+    # rules for SBR; 0 when it cannot be told apart from the core rate.
+    r = BitReader(config)
+    object_type = read_audio_object_type(r)
+    frequency = read_sampling_frequency(r)
+    channel_config = r.bits(4)
+
+    if object_type in (5, 29):
+        return read_sampling_frequency(r)
+
+    sbr_present = None
+
+    # Backward compatible SBR signalling follows the GASpecificConfig
+    # (configs with a program config element are left undecided).
+    if object_type in GA_SPECIFIC_TYPES and channel_config != 0:
+        r.bits(1)                       # frameLengthFlag
+        if r.bits(1):                   # dependsOnCoreCoder
+            r.bits(14)
+        extension_flag = r.bits(1)
+        if object_type in (6, 20):
+            r.bits(3)                   # layerNr
+
+        supported = True
+        if extension_flag:
+            if object_type == 22:
+                r.bits(16)
+            elif object_type in (17, 19, 20, 23):
+                r.bits(3)
+            supported = not r.bits(1)   # extensionFlag3
+
+        if supported and object_type in ER_TYPES:
+            supported = r.bits(2) not in (2, 3)     # epConfig
+
+        if supported and r.bits_left() >= 16 and r.bits(11) == 0x2B7:
+            if read_audio_object_type(r) in (5, 22):
+                sbr_present = r.bits(1)
+                if sbr_present:
+                    return read_sampling_frequency(r)
+
+    if sbr_present == 0 or object_type not in SBR_CAPABLE_TYPES or frequency > 24000:
+        return frequency
+
+    return 0
+
+
+def parse_sample_rate(stsd):
+    # stsd: version/flags, entry count, then the first sample entry.
+    if len(stsd) < 8 or struct.unpack_from(">I", stsd, 4)[0] == 0:
+        return 0
+
+    entry_length, entry_name = struct.unpack_from(">I4s", stsd, 8)
+    entry = stsd[16:8 + entry_length]
+    if len(entry) < 28:
+        return 0
+
+    sample_rate = struct.unpack_from(">I", entry, 24)[0] >> 16
+
+    if entry_name != b"mp4a" or len(entry) < 36:
+        return sample_rate
+
+    extra_length, extra_name = struct.unpack_from(">I4s", entry, 28)
+    if extra_name != b"esds":
+        return sample_rate
+
+    esds = entry[36 + 4:28 + extra_length]
+    try:
+        tag, length, position = read_descriptor_header(esds, 0)
+        if tag != 0x03:
+            return sample_rate
+
+        flags = esds[position + 2]
+        position += 3
+        if flags & 0x80:
+            position += 2
+        if flags & 0x40:
+            position += 1 + esds[position]
+        if flags & 0x20:
+            position += 2
+
+        tag, length, position = read_descriptor_header(esds, position)
+        if tag != 0x04:
+            return sample_rate
+
+        object_type, stream_type = esds[position], esds[position + 1] >> 2
+        end = position + length
+        position += 13
+        if (object_type, stream_type) != (0x40, 0x05) or position >= end:
+            return sample_rate
+
+        tag, length, position = read_descriptor_header(esds, position)
+        if tag != 0x05:
+            return sample_rate
+
+        return aac_sample_rate(esds[position:position + length]) or sample_rate
+
+    except IndexError:
+        return sample_rate
+
+
+def read_trak(fileobj, start, end):
+    # Returns (handler type, duration, sample rate) of a trak atom.
+    handler = None
+    duration = 0.0
+    sample_rate = 0
+
+    for name, data_offset, atom_end in iter_atoms(fileobj, start, end):
+        if name != b"mdia":
+            continue
+
+        for child, child_offset, child_end in iter_atoms(fileobj, data_offset, atom_end):
+            if child == b"mdhd":
+                duration = parse_duration(read_payload(fileobj, child_offset, child_end))
+            elif child == b"hdlr":
+                handler = read_payload(fileobj, child_offset, child_end)[8:12]
+                if handler != b"soun":
+                    return handler, duration, sample_rate
+            elif child == b"minf":
+                stsd = find_path(fileobj, child_offset, child_end, (b"stbl", b"stsd"))
+                if stsd is not None:
+                    sample_rate = parse_sample_rate(read_payload(fileobj, *stsd))
+
+        break
+
+    return handler, duration, sample_rate
+
+
+def find_path(fileobj, start, end, path):
+    # (data offset, end) of the atom at path below start..end, or None.
+    for name, data_offset, atom_end in iter_atoms(fileobj, start, end):
+        if name == path[0]:
+            if len(path) == 1:
+                return data_offset, atom_end
+            return find_path(fileobj, data_offset + CONTAINER_SKIP.get(name, 0), atom_end, path[1:])
+    return None
+
+
+def read_mp4(fileobj):
+    # Walks the atom tree with seeks, reading only the mvhd/mdhd/stsd of the
+    # audio track and the wanted ilst items. mdat is never read, wherever it is.
+    fileobj.seek(0, 2)
+    file_size = fileobj.tell()
+
+    moov = find_path(fileobj, 0, file_size, (b"moov",))
+    if moov is None:
+        raise MP4Error("not a MP4 file")
+
+    result = MP4Atoms()
+    movie_duration = None
+    found_audio = False
+
+    for name, data_offset, atom_end in iter_atoms(fileobj, *moov):
+        if name == b"mvhd":
+            movie_duration = parse_duration(read_payload(fileobj, data_offset, atom_end))
+
+        elif name == b"trak" and not found_audio:
+            handler, duration, sample_rate = read_trak(fileobj, data_offset, atom_end)
+            if handler == b"soun":
+                found_audio = True
+                result.length = duration
+                result.sample_rate = sample_rate
+
+        elif name == b"udta":
+            ilst = find_path(fileobj, data_offset, atom_end, (b"meta", b"ilst"))
+            if ilst is not None:
+                read_ilst(fileobj, ilst[0], ilst[1], result.tags)
+
+    if not found_audio:
+        if movie_duration is None:
+            raise MP4Error("track has no audio data")
+        result.length = movie_duration
+
+    return result
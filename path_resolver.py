@@ -0,0 +1,158 @@
+import os
+import unicodedata
+
+import file_identity
+from crate_index import normalize_track_path
+
+# Turns the volume-relative paths stored in crates into the paths of the files
+# on this machine, once, in stage 1:
+#
+#   volume maps     "FROM=TO" prefixes, longest match first, so a library
+#                   written on one machine resolves on another: "/=/mnt/music"
+#                   puts the whole volume under /mnt/music,
+#                   "/Volumes/USB=/media/usb" moves one drive
+#   existence       every folder a track lives in is listed once with
+#                   os.scandir() (shared with file_identity), so 60k tracks in
+#                   3k folders cost 3k folder reads instead of 60k stats; only
+#                   names the listing does not contain verbatim (other case or
+#                   Unicode normalization) are stat'ed. This only settles
+#                   existence: listings carry no size or modification time,
+#                   so with the metadata cache on, TrackCache.lookup() still
+#                   stats each track that exists for its key
+#   moved files     a track that is still missing is looked up by file name in
+#                   the folders given with --find-moved (listed recursively on
+#                   first use). When the metadata cache knows the track's size,
+#                   the candidate must have that size, even if its name is
+#                   unique; otherwise only a unique name wins. Ambiguous or
+#                   mismatched names stay missing rather than point at the
+#                   wrong file.
+
+
+def parse_volume_maps(specs):
+    # ["/Volumes/USB=/media/usb", ...] -> [("/Volumes/USB", "/media/usb"), ...],
+    # longest prefix first; a root prefix is stored as ""
+    volume_maps = []
+
+    for spec in specs or ():
+        source, separator, target = spec.partition("=")
+        if not separator or not source or not target:
+            raise ValueError(f"expected FROM=TO, got {spec!r}")
+        volume_maps.append((normalize_track_path(source).rstrip(os.sep), os.path.abspath(target).rstrip(os.sep)))
+
+    return sorted(volume_maps, key=lambda volume_map: len(volume_map[0]), reverse=True)
+
+
+def map_volume(path, volume_maps):
+    for source, target in volume_maps:
+        if not source or path == source or path.startswith(source + os.sep):
+            return target + path[len(source):]
+
+    return path
+
+
+def name_key(name):
+    return unicodedata.normalize("NFC", name).casefold()
+
+
+def file_size(path):
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return None
+
+
+class PathResolver:
+    def __init__(self, volume_maps=(), search_folders=()):
+        self.volume_maps = list(volume_maps)
+        self.search_folders = list(search_folders)
+        self.listings = {}          # folder -> file_identity.list_folder() result
+        self.moved_files = None     # name_key() -> paths under the search folders
+        self.folder_reads = 0
+        self.stats = 0
+        self.relocated = {}         # mapped path -> where the file was found
+        self.missing = set()
+
+    def listing(self, folder):
+        if folder not in self.listings:
+            self.listings[folder] = file_identity.list_folder(folder, inodes=file_identity.LIST_FOLDERS)
+            self.folder_reads += 1
+
+        return self.listings[folder]
+
+    def exists(self, path):
+        folder, name = os.path.split(path)
+        listing = self.listing(folder)
+
+        if listing is not None:
+            if name in listing[1]:
+                return True
+            if listing[0] is None:          # the folder itself is missing
+                return False
+
+        self.stats += 1
+        return os.path.exists(path)
+
+    def index_moved_files(self):
+        self.moved_files = {}
+        folders = list(self.search_folders)
+
+        # same walk as scan_crate_folder(): symlinked folders are not entered
+        while folders:
+            folder = folders.pop()
+            self.folder_reads += 1
+
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        try:
+                            is_dir = entry.is_dir()
+                        except OSError:
+                            is_dir = False
+
+                        if is_dir:
+                            if not entry.is_symlink():
+                                folders.append(entry.path)
+                        else:
+                            self.moved_files.setdefault(name_key(entry.name), []).append(entry.path)
+            except OSError:
+                continue
+
+    def find_moved(self, path, stored_size=None):
+        if self.moved_files is None:
+            self.index_moved_files()
+
+        candidates = self.moved_files.get(name_key(os.path.basename(path)), [])
+        if not candidates:
+            return None
+
+        # a known size has to match, even for a unique name; without one only
+        # a unique name is trusted
+        size = stored_size(path) if stored_size else None
+        if size is None:
+            return candidates[0] if len(candidates) == 1 else None
+
+        self.stats += len(candidates)
+        matches = [candidate for candidate in candidates if file_size(candidate) == size]
+        return matches[0] if len(matches) == 1 else None
+
+    def resolve(self, path, stored_size=None):
+        # The path the track's file has on this machine; a missing file keeps
+        # its mapped path (and is added to self.missing) so it is reported
+        # under the name the crate gives it.
+        mapped = map_volume(path, self.volume_maps)
+
+        if self.exists(mapped):
+            return mapped
+
+        moved = self.find_moved(mapped, stored_size) if self.search_folders else None
+        if moved is not None:
+            self.relocated[mapped] = moved
+            return moved
+
+        self.missing.add(mapped)
+        return mapped
+
+    def resolve_all(self, paths, stored_size=None):
+        # path -> resolved path; stored_size(path) gives the size the file had
+        # when it was last converted, or None
+        return {path: self.resolve(path, stored_size) for path in paths}
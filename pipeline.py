@@ -0,0 +1,69 @@
+import queue
+import threading
+
+# Stage 2 feeds extracted tracks to the XML serializer through a bounded
+# queue, so the collection is written while extraction is still running and
+# at most QUEUE_SIZE finished tracks wait in memory. When the serializer
+# falls behind, put() blocks extraction instead of letting results pile up.
+
+QUEUE_SIZE = 256
+DONE = object()
+
+
+class ConsumerThread:
+    # Calls consume(item) for every item put(), in order, on a background
+    # thread. An exception raised by consume() stops the thread and is raised
+    # again by the next put() or by close().
+
+    def __init__(self, consume, maxsize=QUEUE_SIZE, name="consumer"):
+        self.consume = consume
+        self.queue = queue.Queue(maxsize)
+        self.error = None
+        self.cancelled = False
+        self.thread = threading.Thread(target=self.run, name=name, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is DONE:
+                return
+            if self.cancelled:
+                continue
+
+            try:
+                self.consume(item)
+            except BaseException as e:
+                # the rest is dropped, so put() never blocks on a queue nobody reads
+                self.error = e
+                self.cancelled = True
+
+    def put(self, item):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(item)
+
+    def close(self):
+        # Waits for every item put so far to be consumed.
+        if self.thread.is_alive():
+            self.queue.put(DONE)
+            self.thread.join()
+
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def cancel(self):
+        # Drops the items still waiting and stops the thread.
+        self.cancelled = True
+        if self.thread.is_alive():
+            self.queue.put(DONE)
+            self.thread.join()
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.close()
+        else:
+            self.cancel()
@@ -0,0 +1,322 @@
+import bisect
+import os
+import struct
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import open_counted
+
+# Read-ahead for slow storage (USB hard drives, SMB/NFS shares): a few threads
+# per mount read the regions of upcoming files that the parsers need into
+# memory, so the latency of many small reads overlaps instead of adding up.
+# Parsers get a PrefetchedFile that serves reads from those buffers; anything
+# outside them is read from the file as usual, so a missed region is only
+# slower, never wrong.
+
+DEFAULT_DEPTH = 4           # files in flight per mount
+WINDOW_PER_DEPTH = 4        # files buffered ahead of the parser per unit of depth
+
+HEAD_PEEK = 64 * 1024       # first read of an MP3; holds most ID3v2 tags whole
+MPEG_PEEK = 16 * 1024       # after the ID3v2 tag: first frames and the Xing/VBRI header
+TAIL_PEEK = 1024            # end of an MP3: ID3v1 and footer lookups
+FMT_PEEK = 64               # a WAV fmt chunk is 16 to 40 bytes
+
+
+class PrefetchedFile:
+    # Read-only file object over the prefetched regions of one file.
+
+    def __init__(self, path, size, regions, bytes_read=0):
+        self.name = path
+        self.size = size
+        self.bytes_read = bytes_read    # bytes the prefetch thread read from disk
+        self.position = 0
+        self.fallback = None
+        self.starts, self.blocks = merge_regions(regions)
+
+    def __getstate__(self):
+        # shipped to worker processes without the open fallback handle
+        state = self.__dict__.copy()
+        state["fallback"] = None
+        return state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.fallback is not None:
+            self.fallback.close()
+            self.fallback = None
+
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.position
+        elif whence == 2:
+            offset += self.size
+
+        if offset < 0:
+            raise OSError("negative seek position")
+
+        self.position = offset
+        return offset
+
+    def read(self, size=-1):
+        start = self.position
+        end = self.size if size is None or size < 0 else min(self.size, start + size)
+
+        if end <= start:
+            return b""
+
+        index = bisect.bisect_right(self.starts, start) - 1
+        if index >= 0:
+            block_start = self.starts[index]
+            block = self.blocks[index]
+
+            if end <= block_start + len(block):
+                self.position = end
+                return block[start - block_start:end - block_start]
+
+        if self.fallback is None:
+            self.fallback = open_counted(self.name)
+
+        self.fallback.seek(start)
+        data = self.fallback.read(end - start)
+        self.position = start + len(data)
+        return data
+
+
+def merge_regions(regions):
+    # (offset, bytes) pieces -> sorted start offsets and non-overlapping blocks
+    starts, blocks = [], []
+
+    for offset, data in sorted(regions, key=lambda region: region[0]):
+        if not data:
+            continue
+
+        if blocks and offset <= starts[-1] + len(blocks[-1]):
+            previous = blocks[-1]
+            overlap = starts[-1] + len(previous) - offset
+            if len(data) > overlap:
+                blocks[-1] = previous + data[overlap:]
+        else:
+            starts.append(offset)
+            blocks.append(data)
+
+    return starts, blocks
+
+
+class RegionReader:
+    # Unbuffered reads, so the byte count is exactly what came from the disk.
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.regions = []
+        self.bytes_read = 0
+
+    def read(self, offset, size):
+        self.fileobj.seek(offset)
+        chunks = []
+        remaining = size
+
+        while remaining > 0:
+            chunk = self.fileobj.read(remaining)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+
+        data = b"".join(chunks)
+        self.bytes_read += len(data)
+        self.regions.append((offset, data))
+        return data
+
+
+def mp3_regions(reader, size):
+    head = reader.read(0, min(size, HEAD_PEEK))
+
+    if head[:3] == b"ID3" and len(head) >= 10:
+        tag_end = 10 + ((head[6] & 0x7f) << 21 | (head[7] & 0x7f) << 14 | (head[8] & 0x7f) << 7 | (head[9] & 0x7f))
+        if head[5] & 0x10:
+            tag_end += 10   # footer
+
+        wanted = min(size, tag_end + MPEG_PEEK)
+        if wanted > len(head):
+            reader.read(len(head), wanted - len(head))
+        head_end = wanted
+    else:
+        head_end = len(head)
+
+    if size > head_end:
+        tail_start = max(head_end, size - TAIL_PEEK)
+        reader.read(tail_start, size - tail_start)
+
+
+def mp4_regions(reader, size):
+    # Every top-level atom header, plus the whole moov atom.
+    position = 0
+    while position + 8 <= size:
+        header = reader.read(position, 16)
+        if len(header) < 8:
+            return
+
+        length, name = struct.unpack(">I4s", header[:8])
+        if length == 1 and len(header) >= 16:
+            length = struct.unpack(">Q", header[8:16])[0]
+        elif length == 0:
+            length = size - position
+
+        if length < 8:
+            return
+
+        if name == b"moov":
+            reader.read(position, min(length, size - position))
+
+        position += length
+
+
+def wav_regions(reader, size):
+    # The RIFF header, every chunk header, the fmt chunk and the id3 chunk.
+    header = reader.read(0, 12)
+    if len(header) < 12 or header[:4] != b"RIFF":
+        return
+
+    end = min(8 + struct.unpack("<I", header[4:8])[0], size)
+    position = 12
+
+    while position + 8 <= end:
+        chunk_header = reader.read(position, 8)
+        if len(chunk_header) < 8:
+            return
+
+        chunk_id, chunk_size = struct.unpack("<4sI", chunk_header)
+
+        if chunk_id == b"fmt ":
+            reader.read(position + 8, min(chunk_size, FMT_PEEK))
+        elif chunk_id in (b"id3 ", b"ID3 "):
+            reader.read(position + 8, chunk_size)
+
+        position += 8 + chunk_size + (chunk_size & 1)
+
+
+REGION_READERS = {".mp3": mp3_regions, ".m4a": mp4_regions, ".wav": wav_regions}
+
+
+def prefetch_file(path):
+    # Returns a PrefetchedFile, or None when the file cannot be prefetched;
+    # the extractor then opens it itself and reports any error as usual.
+    region_reader = REGION_READERS.get(os.path.splitext(path)[1].lower())
+    if region_reader is None:
+        return None
+
+    try:
+        with open(path, "rb", buffering=0) as f:
+            size = os.fstat(f.fileno()).st_size
+            reader = RegionReader(f)
+            region_reader(reader, size)
+    except (OSError, struct.error):
+        return None
+
+    return PrefetchedFile(path, size, reader.regions, reader.bytes_read)
+
+
+def parse_mount_depths(specs):
+    # ["/Volumes/USB=16", ...] -> {"/Volumes/USB": 16}
+    depths = {}
+
+    for spec in specs or ():
+        mount, separator, depth = spec.rpartition("=")
+        if not separator or not mount:
+            raise ValueError(f"expected MOUNT=DEPTH, got {spec!r}")
+        depths[os.path.realpath(mount)] = int(depth)
+
+    return depths
+
+
+class Prefetcher:
+    # Each mount gets its own thread pool of its configured depth, so a slow
+    # network share never holds up reads from a local disk and vice versa.
+
+    def __init__(self, depth=DEFAULT_DEPTH, mount_depths=None):
+        self.depth = depth
+        self.mount_depths = mount_depths or {}
+        self.mounts = {}        # directory -> mount point
+        self.executors = {}
+
+    def mount_for(self, path):
+        directory = os.path.dirname(path)
+        mount = self.mounts.get(directory)
+
+        if mount is None:
+            mount = os.path.realpath(directory)
+            while not os.path.ismount(mount):
+                parent = os.path.dirname(mount)
+                if parent == mount:
+                    break
+                mount = parent
+            self.mounts[directory] = mount
+
+        return mount
+
+    def depth_for(self, mount):
+        return self.mount_depths.get(mount, self.depth)
+
+    def executor_for(self, path):
+        mount = self.mount_for(path)
+        executor = self.executors.get(mount)
+
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max(1, self.depth_for(mount)),
+                                          thread_name_prefix="prefetch")
+            self.executors[mount] = executor
+
+        return executor
+
+    def iter_files(self, paths):
+        # Yields a PrefetchedFile (or None) for each path, in order. At most
+        # WINDOW_PER_DEPTH * depth files are buffered ahead of the consumer.
+        window = WINDOW_PER_DEPTH * max([self.depth, *self.mount_depths.values(), 1])
+        pending = deque()
+        paths = iter(paths)
+
+        try:
+            for path in paths:
+                pending.append(self.executor_for(path).submit(prefetch_file, path))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+            self.close()
+
+    def close(self):
+        for executor in self.executors.values():
+            executor.shutdown(wait=True, cancel_futures=True)
+        self.executors.clear()
+
+
+# The prefetched file of the track being extracted in this process; see open_track().
+current = {}
+
+
+def open_track(path):
+    # Used by the extractors instead of open(path, "rb").
+    prefetched = current.get(path)
+    if prefetched is not None:
+        prefetched.seek(0)
+        return prefetched
+
+    return open_counted(path)
@@ -0,0 +1,98 @@
+from beatgrid import Beatgrid
+
+# Compact per-track records. They use __slots__ instead of a dict each, as
+# stage 2 creates one per track (and the cache one per hit); a record lives
+# until its TRACK element has been spooled, so only the few waiting in the
+# pipeline's queue are alive at once.
+
+
+class HotCue:
+    __slots__ = ("index", "position_ms", "name", "rgb")
+
+    def __init__(self, index, position_ms, name, rgb):
+        self.index = index
+        self.position_ms = position_ms
+        self.name = name
+        self.rgb = rgb              # 0xRRGGBB
+
+    @property
+    def color(self):
+        return "#{:06X}".format(self.rgb)
+
+    @property
+    def red(self):
+        return self.rgb >> 16 & 0xFF
+
+    @property
+    def green(self):
+        return self.rgb >> 8 & 0xFF
+
+    @property
+    def blue(self):
+        return self.rgb & 0xFF
+
+    def __eq__(self, other):
+        return isinstance(other, HotCue) and self.to_json() == other.to_json()
+
+    def __repr__(self):
+        return f"HotCue({self.index!r}, {self.position_ms!r}, {self.name!r}, {self.color})"
+
+    def __getstate__(self):
+        return self.to_json()
+
+    def __setstate__(self, state):
+        self.index, self.position_ms, self.name, self.rgb = state
+
+    def to_json(self):
+        return [self.index, self.position_ms, self.name, self.rgb]
+
+
+class TrackRecord:
+    __slots__ = ("file_location", "title", "artist", "bpm", "key", "total_time_sec",
+                 "hot_cues", "beatgrid", "sample_rate")
+
+    def __init__(self, file_location, title, artist, bpm=0.0, key="Unknown", total_time_sec=0,
+                 hot_cues=(), beatgrid=None, sample_rate=0):
+        self.file_location = file_location
+        self.title = title
+        self.artist = artist
+        self.bpm = bpm
+        self.key = key
+        self.total_time_sec = total_time_sec
+        self.hot_cues = hot_cues    # tuple of HotCue
+        self.beatgrid = beatgrid    # Beatgrid or None
+        self.sample_rate = sample_rate
+
+    def __eq__(self, other):
+        return (isinstance(other, TrackRecord) and self.file_location == other.file_location
+                and self.to_json() == other.to_json())
+
+    def __repr__(self):
+        return f"TrackRecord({self.file_location!r}, {self.title!r}, {self.artist!r})"
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+    def to_json(self):
+        # everything but the path, which the cache keeps as its key
+        return {
+            "title": self.title,
+            "artist": self.artist,
+            "bpm": self.bpm,
+            "key": self.key,
+            "total_time_sec": self.total_time_sec,
+            "hot_cues": [cue.to_json() for cue in self.hot_cues],
+            "beatgrid": self.beatgrid.to_json() if self.beatgrid is not None else None,
+            "sample_rate": self.sample_rate,
+        }
+
+    @classmethod
+    def from_json(cls, file_location, value):
+        grid = value["beatgrid"]
+        return cls(file_location, value["title"], value["artist"], value["bpm"], value["key"],
+                   value["total_time_sec"], tuple(HotCue(*cue) for cue in value["hot_cues"]),
+                   Beatgrid.from_json(grid) if grid is not None else None, value["sample_rate"])
@@ -0,0 +1,81 @@
+import struct
+
+# Only the fmt chunk and the id3 chunk's position are needed; the data chunk
+# (almost all of a WAV file) and everything else is skipped by its header.
+ID3_CHUNK_IDS = (b"id3 ", b"ID3 ")
+
+
+class RiffError(Exception):
+    pass
+
+
+class WaveInfo:
+    def __init__(self):
+        self.channels = 0
+        self.sample_rate = 0
+        self.bits_per_sample = 0
+        self.length = 0.0           # seconds
+        self.id3_offset = None      # file offset of the id3 chunk's data, if there is one
+        self.id3_size = 0
+
+
+def iter_chunks(fileobj, start, end):
+    # (chunk id, data offset, data size) for each chunk header between start and end.
+    position = start
+    while position + 8 <= end:
+        fileobj.seek(position)
+        header = fileobj.read(8)
+        if len(header) < 8:
+            return
+
+        chunk_id, size = struct.unpack("<4sI", header)
+        yield chunk_id, position + 8, size
+
+        position += 8 + size + (size & 1)   # chunks are word aligned
+
+
+def scan_wave(fileobj):
+    # Hops the chunk headers of a RIFF/WAVE file with seeks; reads the 16
+    # bytes of fmt and nothing of data. Duration is computed the way mutagen's
+    # WaveStreamInfo does it.
+    fileobj.seek(0)
+    header = fileobj.read(12)
+
+    if len(header) < 12 or header[:4] != b"RIFF":
+        raise RiffError("not a RIFF file")
+
+    if header[8:12] != b"WAVE":
+        raise RiffError("Expected RIFF/WAVE.")
+
+    riff_size = struct.unpack("<I", header[4:8])[0]
+    fileobj.seek(0, 2)
+    end = min(8 + riff_size, fileobj.tell())
+
+    info = WaveInfo()
+    fmt = None
+    data_size = None
+
+    for chunk_id, data_offset, size in iter_chunks(fileobj, 12, end):
+        if chunk_id == b"fmt " and fmt is None:
+            fileobj.seek(data_offset)
+            fmt = fileobj.read(min(size, 16))
+
+        elif chunk_id == b"data" and data_size is None:
+            data_size = size
+
+        elif chunk_id in ID3_CHUNK_IDS and info.id3_offset is None:
+            info.id3_offset = data_offset
+            info.id3_size = size
+
+    if fmt is None:
+        raise RiffError("'fmt'")
+
+    if len(fmt) < 16:
+        raise RiffError("fmt chunk is too short")
+
+    _, info.channels, info.sample_rate, _, block_align, info.bits_per_sample = struct.unpack("<HHLLHH", fmt)
+
+    if block_align > 0 and data_size is not None and info.sample_rate > 0:
+        info.length = data_size / block_align / info.sample_rate
+
+    return info
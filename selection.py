@@ -0,0 +1,68 @@
+import datetime
+import fnmatch
+import os
+import re
+
+# Filters for converting part of a library, applied before stage 2 so tracks
+# outside the selection are never opened:
+#
+#   crate patterns   shell-style globs matched case-insensitively against crate
+#                    names as Serato stores them ("Parent%%Child"; "/" may be
+#                    used instead of "%%"). A crate is selected when its own
+#                    name or that of one of its parent crates matches, so
+#                    "House" brings "House%%Deep" and "House%%Deep%%Dub" along.
+#   modified since   only tracks whose file changed at or after a point in time
+
+SUBCRATE_SEPARATOR = "%%"
+DAYS_AGO = re.compile(r"^(\d+)d$")
+
+
+def crate_name(crate_file_path):
+    # "…/subcrates/Parent%%Child.crate" -> "Parent%%Child"
+    name = os.path.basename(crate_file_path)
+    return name[:-len(".crate")] if name.endswith(".crate") else name
+
+
+def normalize_pattern(pattern):
+    return pattern.replace("/", SUBCRATE_SEPARATOR).casefold()
+
+
+def crate_matches(name, patterns):
+    segments = name.casefold().split(SUBCRATE_SEPARATOR)
+
+    for depth in range(1, len(segments) + 1):
+        prefix = SUBCRATE_SEPARATOR.join(segments[:depth])
+        if any(fnmatch.fnmatchcase(prefix, pattern) for pattern in patterns):
+            return True
+
+    return False
+
+
+def select_crates(crate_file_paths, patterns):
+    # The matching crate files, in their original order.
+    patterns = [normalize_pattern(pattern) for pattern in patterns]
+    return [path for path in crate_file_paths if crate_matches(crate_name(path), patterns)]
+
+
+def parse_since(text, now=None):
+    # "YYYY-MM-DD", "YYYY-MM-DD HH:MM[:SS]" (local time) or "Nd" (N days ago)
+    # -> POSIX timestamp. Raises ValueError for anything else.
+    text = text.strip()
+    days = DAYS_AGO.match(text)
+
+    if days:
+        now = datetime.datetime.now().timestamp() if now is None else now
+        return now - int(days.group(1)) * 24 * 60 * 60
+
+    try:
+        return datetime.datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        raise ValueError(f"expected YYYY-MM-DD, 'YYYY-MM-DD HH:MM' or a number of days like 7d, got {text!r}") from None
+
+
+def modified_since(track_path, since):
+    # Files that cannot be stat'ed are kept, so stage 2 reports them as missing.
+    try:
+        return os.stat(track_path).st_mtime >= since
+    except OSError:
+        return True
@@ -1,61 +1,60 @@
-print(r'''         
+import os
+import argparse
+import contextlib
+import importlib
+import re
+import platform
+import time
+import urllib.parse
+from collections import deque
+from itertools import repeat
+
+from track_cache import TrackCache, DEFAULT_CACHE_FILE, MISSING_FILE_KEY, file_key
+import snapshot
+from xml_writer import XmlStreamWriter, ElementSpool
+from crate_index import CrateIndex
+from beatgrid import Beatgrid
+from records import TrackRecord
+import serato_database
+import serato_crate
+import metrics
+import prefetch
+import locality
+import selection
+import file_identity
+import path_resolver
+import pipeline
+from utils import convert_key_to_camelot
+from update_check import UpdateCheck
+
+BANNER = r'''         
                      _       ___           _                 _ _               
                     | |     |__ \         | |               | | |              
   ___  ___ _ __ __ _| |_ ___   ) |_ __ ___| | _____  _ __ __| | |__   _____  __
  / __|/ _ \ '__/ _` | __/ _ \ / /| '__/ _ \ |/ / _ \| '__/ _` | '_ \ / _ \ \/ /
  \__ \  __/ | | (_| | || (_) / /_| | |  __/   < (_) | | | (_| | |_) | (_) >  < 
  |___/\___|_|  \__,_|\__\___/____|_|  \___|_|\_\___/|_|  \__,_|_.__/ \___/_/\_\
-''')
+'''
 
 current_version = "serato2rekordbox v1.3"
-print("\nVersion 1.3\n\n")
-
-import os
-import re
-import struct
-from xml.etree.ElementTree import Element, SubElement, tostring
-from xml.dom import minidom
-from tqdm import tqdm
-import platform
-import urllib.parse
-from collections import defaultdict
-from collections import OrderedDict 
-
-import extract_mp3
-import extract_m4a
-import extract_wav
-
-import urllib.request
-import ssl
-
-try:
-    url = "https://raw.githubusercontent.com/BytePhoenixCoding/serato2rekordbox/main/README.md"
-    context = ssl._create_unverified_context()  # <- disable SSL verification
-    with urllib.request.urlopen(url, timeout=5, context=context) as response:
-        content = response.read().decode('utf-8')
-
-    if current_version not in content:
-        print("──────────────────────────────────────────────────────────")
-        print("⚠️ A new version of serato2rekordbox is available!")
-        print("🔗 Please update here: https://github.com/BytePhoenixCoding/serato2rekordbox")
-        print("──────────────────────────────────────────────────────────\n")
-    else:
-        print("✅ serato2rekordbox is up to date.")
-except Exception as e:
-    print(f"(Update check skipped: {e})")
 
-START_MARKER = b'ptrk'
-PATH_LENGTH_OFFSET = 4
-START_MARKER_FULL_LENGTH = len(START_MARKER) + PATH_LENGTH_OFFSET
 M4A_BEATGRID_OFFSET = 0.07
 M4A_HOTCUE_OFFSET = 0.03
+OUTPUT_FILE = "serato2rekordbox.xml"
+CRATE_THREADS = 8           # crates opened and parsed at once in stage 1
+TRACK_WINDOW = 2048         # tracks looked up in the cache and handed to the pool at a time in stage 2
+
+# Extractor modules by file extension. They are imported on first use (and
+# pull in mutagen), so nothing format specific is loaded before stage 2.
+EXTRACTORS = {'.mp3': 'extract_mp3', '.m4a': 'extract_m4a', '.wav': 'extract_wav'}
 
 unsuccessfulConversions = [] 
 
-def prettify(elem):
-    rough_string = tostring(elem, 'utf-8')
-    reparsed = minidom.parseString(rough_string)
-    return reparsed.toprettyxml(indent="  ")
+def progress(iterable, **kwargs):
+    # tqdm takes longer to import than everything else before stage 1 combined,
+    # so it is loaded when the first progress bar is shown.
+    from tqdm import tqdm
+    return tqdm(iterable, **kwargs)
 
 def find_serato_folder():
     home_dir = os.path.expanduser('~')
@@ -84,104 +83,92 @@ def find_serato_folder():
     print("Please ensure Serato DJ Pro has been run at least once.")
     return None
 
-def generate_rekordbox_xml(processed_data, all_tracks_in_tracks):
-    root = Element("DJ_PLAYLISTS", Version="1.0.0")
-    SubElement(root, "PRODUCT", Name="rekordbox", Version="6.0.0", Company="AlphaTheta")
-    collection = SubElement(root, "COLLECTION", Entries=str(len(all_tracks_in_tracks)))
-    playlists_elem = SubElement(root, "PLAYLISTS")
-    root_playlist = SubElement(playlists_elem, "NODE", Type="0", Name="ROOT", Count="0")
+# Stage 4: the collection comes from the TRACK elements stage 2 spooled (see
+# convert_tracks()), in TrackID order; playlists are written from the crate
+# index. Returns path -> TrackID.
+def generate_rekordbox_xml(playlists, crate_index, spool, track_ids=None,
+                           output_path=OUTPUT_FILE, compact=False):
+    # With fixed TrackIDs (incremental runs) the collection is written in ID order.
+    if track_ids:
+        track_id_map = dict(sorted(track_ids.items(), key=lambda item: item[1]))
+    else:
+        track_id_map = {path: track_id for track_id, path in
+                        enumerate((path for path in crate_index.track_paths if path in spool), 1)}
 
-    track_id_map = {}
-    current_track_id = 1
+    with open(output_path, "w", encoding="utf-8", buffering=1 << 20) as f:
+        xml = XmlStreamWriter(f, compact=compact)
+        xml.start("DJ_PLAYLISTS", Version="1.0.0")
+        xml.empty("PRODUCT", Name="rekordbox", Version="6.0.0", Company="AlphaTheta")
 
-    for path, data in tqdm(all_tracks_in_tracks.items(), desc="⚙️ (4/4) Adding tracks"):
-        track_id_map[path] = current_track_id
+        xml.start("COLLECTION", Entries=str(len(spool)))
+        spool.write_to(xml, progress(((path, str(track_id)) for path, track_id in track_id_map.items()),
+                                     total=len(track_id_map), desc="⚙️ (4/4) Adding tracks"))
+        xml.end("COLLECTION")
 
-        if platform.system() == "Windows":
-            uri_path = path.replace("\\", "/")
-            if re.match(r"^[A-Za-z]:", uri_path):
-                uri_path = "/" + uri_path
-            uri = "file://localhost" + urllib.parse.quote(uri_path)
-        else:
-            uri = "file://localhost/" + urllib.parse.quote(path.lstrip("/"))
-
-        kind = "MP3 File" if path.lower().endswith(".mp3") else "M4A File" if path.lower().endswith(".m4a") else "WAV File"
-
-        tr = SubElement(collection, "TRACK",
-                        TrackID=str(current_track_id),
-                        Name=data["title"].strip(),
-                        Artist=data["artist"].strip(),
-                        Kind=kind,
-                        Location=uri,
-                        AverageBpm=f"{data['bpm']:.2f}",
-                        Tonality=data["key"],
-                        TotalTime=f"{data['totalTime_sec']:.3f}")
-
-        is_m4a = path.lower().endswith(".m4a")
-        sr = data.get("sample_rate", 0)
-        delay = (2 * 1024 / sr) if (is_m4a and sr) else 0.0
-        raw_grid = data.get("beatgrid")
-        seg_positions, seg_bpms = [], []
-
-        if isinstance(raw_grid, dict):
-            markers = raw_grid.get("markers", {})
-            non_term = markers.get("non_terminal") or []
-            terminal = markers.get("terminal")
-
-            if terminal:
-                for i, nt in enumerate(non_term):
-                    pos = float(nt["position"])
-                    nxt = float(non_term[i + 1]["position"]) if i + 1 < len(non_term) else float(terminal["position"])
-                    beats = nt.get("beats_till_next_marker", 0)
-                    dur = nxt - pos
-                    seg_bpms.append((beats * 60.0 / dur) if dur > 0 else data["bpm"])
-                    seg_positions.append(pos)
-
-                seg_positions.append(float(terminal["position"]))
-                seg_bpms.append(float(terminal.get("bpm", data["bpm"])))
+        xml.start("PLAYLISTS")
+        xml.start("NODE", Type="0", Name="ROOT", Count=str(len(playlists)))
 
-            else:
-                seg_positions, seg_bpms = [data.get("first_beat_pos_sec") or 0.0], [data["bpm"]]
+        for plist_name, crate in playlists.items():
+            children = [("TRACK", {"Key": str(track_id_map[track_path])})
+                        for track_path in crate_index.crate_paths(crate) if track_path in track_id_map]
 
-        elif isinstance(raw_grid, list) and raw_grid:
-            seg_positions, seg_bpms = [float(raw_grid[0])], [data["bpm"]]
+            xml.element("NODE", children, Name=plist_name, Type="1", KeyType="0", Entries=str(len(children)))
 
-        else:
-            seg_positions, seg_bpms = [0.0], [data["bpm"]]
+        xml.close()
+
+    return track_id_map
+
+def collection_spool(compact=False):
+    # COLLECTION > TRACK elements sit at depth 2 under DJ_PLAYLISTS
+    return ElementSpool("TRACK", "TrackID", depth=2, compact=compact)
+
+# The TRACK element of one converted track, without its TrackID:
+# (children, attributes) for XmlStreamWriter.element().
+def track_element(path, data):
+    if platform.system() == "Windows":
+        uri_path = path.replace("\\", "/")
+        if re.match(r"^[A-Za-z]:", uri_path):
+            uri_path = "/" + uri_path
+        uri = "file://localhost" + urllib.parse.quote(uri_path)
+    else:
+        uri = "file://localhost/" + urllib.parse.quote(path.lstrip("/"))
+
+    kind = "MP3 File" if path.lower().endswith(".mp3") else "M4A File" if path.lower().endswith(".m4a") else "WAV File"
 
-        for pos, bpm_val in zip(seg_positions, seg_bpms):
-            if is_m4a:
-                pos += M4A_BEATGRID_OFFSET
+    children = []
 
-            pos += delay / 1000.0
-            SubElement(tr, "TEMPO", Inizio=f"{pos:.3f}", Bpm=f"{bpm_val:.2f}", Battito="1")
+    is_m4a = path.lower().endswith(".m4a")
+    sr = data.sample_rate
+    delay = (2 * 1024 / sr) if (is_m4a and sr) else 0.0
+    grid = data.beatgrid
+    offsets = (M4A_BEATGRID_OFFSET, delay / 1000.0) if is_m4a else (delay / 1000.0,)
 
-        for cue in data.get("hot_cues", []):
-            sec = cue["position_ms"] / 1000.0
+    # tracks without a grid get a single segment at 0 with the track BPM
+    if not isinstance(grid, Beatgrid):
+        grid = Beatgrid()
 
-            if is_m4a:
-                sec += M4A_HOTCUE_OFFSET
-            r, g, b = (int(cue["color"][i:i + 2], 16) for i in (1, 3, 5))
+    seg_positions, seg_bpms = grid.segments(data.bpm, offsets)
 
-            SubElement(tr, "POSITION_MARK",
-                       Name=cue["name"], Type="0",
-                       Start=f"{sec:.3f}", Num=str(cue["index"]),
-                       Red=str(r), Green=str(g), Blue=str(b))
-        current_track_id += 1
+    for pos, bpm_val in zip(seg_positions, seg_bpms):
+        children.append(("TEMPO", {"Inizio": f"{pos:.3f}", "Bpm": f"{bpm_val:.2f}", "Battito": "1"}))
 
-    root_playlist.set("Count", str(len(processed_data)))
+    for cue in data.hot_cues:
+        sec = cue.position_ms / 1000.0
 
-    for plist_name, tracks in processed_data.items():
-        pnode = SubElement(root_playlist, "NODE", Name=plist_name, Type="1", KeyType="0", Entries=str(len(tracks)))
+        if is_m4a:
+            sec += M4A_HOTCUE_OFFSET
 
-        for t in tracks:
-            tid = track_id_map.get(t["file_location"])
-            
-            if tid:
-                SubElement(pnode, "TRACK", Key=str(tid))
+        children.append(("POSITION_MARK", {"Name": cue.name, "Type": "0",
+                                           "Start": f"{sec:.3f}", "Num": str(cue.index),
+                                           "Red": str(cue.red), "Green": str(cue.green), "Blue": str(cue.blue)}))
 
-    with open("serato2rekordbox.xml", "w", encoding="utf-8") as f:
-        f.write(prettify(root))
+    return children, {"Name": data.title.strip(),
+                      "Artist": data.artist.strip(),
+                      "Kind": kind,
+                      "Location": uri,
+                      "AverageBpm": f"{data.bpm:.2f}",
+                      "Tonality": data.key,
+                      "TotalTime": f"{data.total_time_sec:.3f}"}
 
 def find_serato_crates(serato_subcrates_path):
     crate_file_paths = []
@@ -191,260 +178,780 @@ def find_serato_crates(serato_subcrates_path):
         return []
 
     print(f"✅ Searching for .crate files in: {serato_subcrates_path}")
-    for root, dirs, files in os.walk(serato_subcrates_path):
-        for file in files:
-            if file.endswith('.crate'):
-                full_path = os.path.join(root, file)
-                crate_file_paths.append(full_path)
+    scan_crate_folder(serato_subcrates_path, crate_file_paths)
     print(f"✅ Found {len(crate_file_paths)} crate files.\n")
     return crate_file_paths
 
-def extract_file_paths_from_crate(crate_file_path, encoding: str = "utf-16-be"):
+# Same order as os.walk(): a folder's crates in listing order, then each
+# subfolder's in turn; symlinked folders are not entered. Whether an entry is
+# a folder comes with the listing, so nothing is stat'ed.
+def scan_crate_folder(folder, crate_file_paths):
+    subfolders = []
+
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+
+                if is_dir:
+                    if not entry.is_symlink():
+                        subfolders.append(entry.path)
+                elif entry.name.endswith('.crate'):
+                    crate_file_paths.append(entry.path)
+    except OSError:
+        return
+
+    for subfolder in subfolders:
+        scan_crate_folder(subfolder, crate_file_paths)
+
+def extract_file_paths_from_crate(crate_file_path, crate=None, errors=None):
+    # Paths in crate order, first occurrence of any duplicate only. crate is
+    # an already open serato_crate.CrateFile for crate_file_path, if any;
+    # problems are appended to errors (default: unsuccessfulConversions).
     paths: list[str] = []
     seen: set[str] = set()
+    errors = unsuccessfulConversions if errors is None else errors
 
     try:
-        with open(crate_file_path, "rb") as f:
-            blob = f.read()
-
-        blob_len = len(blob)
-        i = 0
-
-        while i < blob_len - START_MARKER_FULL_LENGTH:
-            marker_idx = blob.find(START_MARKER, i)
-            if marker_idx == -1:
-                break
-
-            i = marker_idx + len(START_MARKER)
-
-            # read 4-byte BE length
-            if i + PATH_LENGTH_OFFSET > blob_len:
-                unsuccessfulConversions.append({
-                    "type": "crate_parse_error",
-                    "path": crate_file_path,
-                    "error": f"Unexpected EOF after marker at byte {marker_idx}"
-                })
-                break
-
-            path_len = struct.unpack(">I", blob[i : i + PATH_LENGTH_OFFSET])[0]
-            i += PATH_LENGTH_OFFSET
-
-            if i + path_len > blob_len:
-                unsuccessfulConversions.append({
-                    "type": "crate_parse_error",
-                    "path": crate_file_path,
-                    "error": f"Path size {path_len} exceeds remaining data at byte {i}"
-                })
-                break
-
-            raw_path = blob[i : i + path_len]
-            i += path_len                 # advance for next loop
-
-            try:
-                abs_path = raw_path.decode(encoding).strip()
-            except UnicodeDecodeError:
-                unsuccessfulConversions.append({
-                    "type": "crate_decode_error",
-                    "path": crate_file_path,
-                    "error": f"Failed UTF-16 decode at byte {i - path_len}"
-                })
-                continue
-
-            # keep only the first occurrence of any duplicate
+        if crate is None:
+            with serato_crate.CrateFile.open(crate_file_path) as crate:
+                return extract_file_paths_from_crate(crate_file_path, crate, errors)
+
+        for raw_path in crate.iter_paths():
+            abs_path = raw_path.strip()
+
             if abs_path not in seen:
                 paths.append(abs_path)
                 seen.add(abs_path)
 
     except FileNotFoundError:
         print(f"Error: Crate file not found: {crate_file_path}")
+    except serato_crate.CrateError as exc:
+        errors.append({
+            "type": "crate_parse_error",
+            "path": crate_file_path,
+            "error": str(exc)
+        })
     except Exception as exc:
-        unsuccessfulConversions.append({
+        errors.append({
             "type": "crate_read_error",
             "path": crate_file_path,
             "error": str(exc)
         })
 
+    for offset in crate.undecodable if crate is not None else ():
+        errors.append({
+            "type": "crate_decode_error",
+            "path": crate_file_path,
+            "error": f"Failed UTF-16 decode at byte {offset}"
+        })
+
     return paths
 
-### Main script ###
+# Returns the crate's paths plus its snapshot record and how it compares to the
+# previous run ("added", "modified", "unchanged"). A crate whose size and mtime
+# match the previous run is not read at all; one whose content hash matches is
+# not parsed again.
+def read_crate_incremental(crate_file_path, previous, errors=None):
+    try:
+        st = os.stat(crate_file_path)
+    except OSError:
+        return extract_file_paths_from_crate(crate_file_path, errors=errors), None, "modified"
 
-serato_base_path = find_serato_folder()
+    if previous and (previous["size"], previous["mtime_ns"]) == (st.st_size, st.st_mtime_ns):
+        return previous["tracks"], previous, "unchanged"
 
-serato_subcrates_path = os.path.join(serato_base_path, 'subcrates')
+    try:
+        crate = serato_crate.CrateFile.open(crate_file_path)
+    except (OSError, serato_crate.CrateError):
+        return extract_file_paths_from_crate(crate_file_path, errors=errors), None, "modified"
 
-serato_crate_paths = find_serato_crates(serato_subcrates_path)
+    # the hash and the parse both read the mapped file; it is never copied whole
+    with crate:
+        digest = snapshot.content_hash(crate.buffer)
 
-if not serato_crate_paths:
-    print("⚠️ No .crate files found in the subcrates folder.")
-    exit(0)
+        if previous and previous["sha1"] == digest:
+            paths, change = previous["tracks"], "unchanged"
+        else:
+            paths = extract_file_paths_from_crate(crate_file_path, crate, errors)
+            change = "modified" if previous else "added"
+
+    record = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha1": digest, "tracks": paths}
+    return paths, record, change
+
+def print_change_list(label, items, limit=10):
+    if not items:
+        return
+
+    print(f"   {label}:")
+    for item in items[:limit]:
+        print(f"   - {item}")
+    if len(items) > limit:
+        print(f"   ... and {len(items) - limit} more")
+
+def report_incremental_changes(crate_changes, previous_crates, current_crates, track_changes):
+    removed_crates = [path for path in previous_crates if path not in current_crates]
+    added_crates = [path for path, change in crate_changes.items() if change == "added"]
+    modified_crates = [path for path, change in crate_changes.items() if change == "modified"]
+    unchanged_count = sum(1 for change in crate_changes.values() if change == "unchanged")
+    added_tracks, removed_tracks, modified_tracks = track_changes
+
+    print("\n🔁 Changes since the previous conversion:")
+    print(f"   Crates: {len(added_crates)} added, {len(removed_crates)} removed, "
+          f"{len(modified_crates)} modified, {unchanged_count} unchanged")
+    print(f"   Tracks: {len(added_tracks)} added, {len(removed_tracks)} removed, {len(modified_tracks)} modified")
+
+    print_change_list("Added crates", [os.path.basename(p) for p in added_crates])
+    print_change_list("Removed crates", [os.path.basename(p) for p in removed_crates])
+    print_change_list("Modified crates", [os.path.basename(p) for p in modified_crates])
+    print_change_list("Added tracks", [os.path.basename(p) for p in added_tracks])
+    print_change_list("Removed tracks", [os.path.basename(p) for p in removed_tracks])
+    print_change_list("Modified tracks", [os.path.basename(p) for p in modified_tracks])
+
+# Runs inside worker processes when --workers > 1, so errors are returned
+# as (None, error, stats) instead of being appended to unsuccessfulConversions.
+# stats is (extractor, seconds, bytes read) for the metrics report, or None
+# when no extractor ran.
+# With markers_only the extractors read just the hot cues and beatgrid (plus
+# the sample rate for .m4a); the rest comes from the Serato database.
+# prefetched is the track's PrefetchedFile when read-ahead is on.
+# Whether the file exists is known from stage 1 (see path_resolver), so it is
+# not stat'ed here; only a file that fails to open is checked again.
+def process_track(full_system_path, markers_only=False, prefetched=None):
+    file_extension = os.path.splitext(full_system_path)[1].lower()
+
+    if file_extension not in EXTRACTORS:
+        return None, {'type': 'unsupported_format', 'path': full_system_path, 'error': f"Unsupported format: {file_extension}"}, None
+
+    extractor = importlib.import_module(EXTRACTORS[file_extension])
+    extract = extractor.extract_markers if markers_only else extractor.extract_metadata
+    extractor_name = f"{extractor.__name__}.{extract.__name__}"
+    start, read_before = time.perf_counter(), metrics.bytes_read
+
+    if prefetched is not None:
+        prefetch.current[full_system_path] = prefetched
 
-track_to_crates = defaultdict(list)
-all_track_paths_from_crates = set()
+    try:
+        track_data, error = extract_track(full_system_path, extract)
+    finally:
+        prefetch.current.pop(full_system_path, None)
 
-for path in tqdm(serato_crate_paths, desc="⚙️ (1/4) Reading crate contents"):
-    crate_name = os.path.basename(path)[:-6]
+    read = metrics.bytes_read - read_before + (prefetched.bytes_read if prefetched is not None else 0)
+    stats = (extractor_name, time.perf_counter() - start, read)
+    return track_data, error, stats
 
+def extract_track(full_system_path, extract):
     try:
-        formatted_crate_name = crate_name.split('%%')[0] + " [" + crate_name.split('%%')[1] + "]"
-    except IndexError:
-        formatted_crate_name = crate_name 
+        extracted_data = extract(full_system_path)
+
+        metadata = extracted_data.get('metadata', {})
+        hot_cues = extracted_data.get('hot_cues', [])
+        beatgrid = extracted_data.get('beatgrid')
+
+        return TrackRecord(
+            file_location=full_system_path,
+            title=metadata.get('title', os.path.basename(full_system_path)),
+            artist=metadata.get('artist', 'Unknown Artist'),
+            bpm=metadata.get('bpm', 0.0),
+            key=metadata.get('key', 'Unknown'),
+            total_time_sec=metadata.get('duration_sec', 0),
+            hot_cues=tuple(hot_cues),
+            beatgrid=beatgrid,
+            sample_rate=metadata.get('sample_rate', 0)
+        ), None
+
     except Exception as e:
-         unsuccessfulConversions.append({'type': 'crate_name_format_error', 'path': path, 'error': f"Error formatting crate name: {e}"})
-         formatted_crate_name = crate_name 
+        if not os.path.exists(full_system_path):
+            return None, {'type': 'file_not_found', 'path': full_system_path, 'error': 'File not found'}
+        return None, {'type': 'processing_error', 'path': full_system_path, 'error': f"{e}"}
+
+# The process pool shared by every window of stage 2, or None for a serial run.
+def track_pool(workers):
+    if workers <= 1:
+        return contextlib.nullcontext()
+
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(max_workers=workers)
+
+# Results are yielded in the order of track_paths, so a pooled run produces
+# exactly the same output as a serial one. executor is a track_pool() to run
+# in; without one, a pool is started for this call.
+def process_tracks(track_paths, workers=1, markers_only=frozenset(), prefetcher=None, executor=None):
+    flags = [path in markers_only for path in track_paths]
+    prefetched = prefetcher.iter_files(track_paths) if prefetcher else repeat(None)
+
+    if workers <= 1 or len(track_paths) < 2:
+        yield from map(process_track, track_paths, flags, prefetched)
+        return
+
+    if executor is None:
+        with track_pool(workers) as executor:
+            yield from process_tracks(track_paths, workers, markers_only, prefetcher, executor)
+        return
+
+    chunksize = max(1, min(64, len(track_paths) // (workers * 8)))
+
+    if prefetcher is None:
+        yield from executor.map(process_track, track_paths, flags, chunksize=chunksize)
+        return
+
+    # executor.map() submits everything up front, which would hold every
+    # prefetched buffer in memory at once; keep a bounded window instead.
+    pending = deque()
+    for path, flag, prefetched_file in zip(track_paths, flags, prefetched):
+        pending.append(executor.submit(process_track, path, flag, prefetched_file))
+        if len(pending) >= workers * 4:
+            yield pending.popleft().result()
+
+    while pending:
+        yield pending.popleft().result()
+
+# Same contract as process_tracks(), but only files whose (size, mtime) changed
+# since the last run are handed to the extractors; everything else comes from the cache.
+def process_tracks_cached(track_paths, workers, cache, keys=None, markers_only=frozenset(), prefetcher=None,
+                          executor=None):
+    lookups = [cache.lookup(path, path in markers_only) for path in track_paths]
+
+    if keys is not None:
+        keys.update((path, key) for path, (key, entry) in zip(track_paths, lookups))
+
+    misses = [path for path, (key, entry) in zip(track_paths, lookups) if entry is None]
+    miss_results = process_tracks(misses, workers, markers_only, prefetcher, executor)
+
+    for path, (key, entry) in zip(track_paths, lookups):
+        if entry is None:
+            track_data, error, stats = next(miss_results)
+            cache.store(path, key, track_data, error, markers_only=path in markers_only)
+            yield track_data, error, stats
+        else:
+            yield entry + (None,)
+
+    cache.commit()
+
+def apply_database_metadata(track_data, record):
+    # Overlays the metadata read from the Serato database on a markers-only result.
+    if record["title"] is not None:
+        track_data.title = record["title"]
+    if record["artist"] is not None:
+        track_data.artist = record["artist"]
+    if record["key"]:
+        track_data.key = convert_key_to_camelot(record["key"])
+
+    track_data.bpm = record["bpm"]
+    track_data.total_time_sec = record["duration_sec"]
+    return track_data
+
+# Stage 1: parse every crate once into the shared crate index. With threads > 1
+# the crates are opened and parsed by a thread pool, so the latency of opening
+# thousands of small files on a slow drive overlaps; results and errors are
+# still merged in discovery order, so the index is the same as a serial run's.
+def read_crates(serato_crate_paths, previous_crates=None, threads=CRATE_THREADS):
+    previous_crates = previous_crates or {}
+    crate_records = {}
+    crate_changes = {}
+    crate_index = CrateIndex()
+
+    def read_crate(path):
+        errors = []
+        return read_crate_incremental(path, previous_crates.get(path), errors) + (errors,)
+
+    if threads > 1 and len(serato_crate_paths) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="crates")
+        results = executor.map(read_crate, serato_crate_paths)
+    else:
+        executor = None
+        results = map(read_crate, serato_crate_paths)
+
+    try:
+        for path, (paths_in_crate, record, change, errors) in zip(
+                serato_crate_paths,
+                progress(results, total=len(serato_crate_paths), desc="⚙️ (1/4) Reading crate contents")):
+            crate_index.add_crate(path, paths_in_crate)
+            crate_changes[path] = change
+            unsuccessfulConversions.extend(errors)
+
+            if record:
+                crate_records[path] = record
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    return crate_index, crate_records, crate_changes
+
+def load_database(serato_base_path):
+    database_path = serato_database.find_database(serato_base_path)
 
-    paths_in_crate = extract_file_paths_from_crate(path)
-    for track_path in paths_in_crate:
+    if database_path is None:
+        print(f"⚠️ No '{serato_database.DATABASE_FILE}' file found, reading all metadata from the audio files.\n")
+        return {}
 
-        normalized_path = track_path.replace('\\', os.sep)
-        if platform.system() != "Windows" and not normalized_path.startswith(os.sep):
-            lookup_path = os.sep + normalized_path
+    try:
+        return serato_database.read_database(database_path)
+    except (OSError, serato_database.DatabaseError) as e:
+        print(f"⚠️ Could not read '{database_path}' ({e}), reading all metadata from the audio files.\n")
+        return {}
+
+# Stages 2 and 4 overlap: tracks are extracted TRACK_WINDOW at a time in the
+# given locality order, and each finished track is handed through a bounded
+# queue to a thread that serializes its TRACK element into spool (see
+# collection_spool()) and lets the record go, so memory does not grow with the
+# library. Failures go to unsuccessfulConversions in crate order, so the error
+# report does not depend on the read order either. Files stage 1 found
+# missing are reported without being touched again, and the folder listings
+# it made give the inode order without listing those folders again.
+def convert_tracks(track_paths, spool, workers=1, cache=None, database=None, track_keys=None, run_metrics=None,
+                   prefetcher=None, order="crate", missing=frozenset(), listings=None):
+    database = database or {}
+    errors = {}
+
+    # Tracks missing from the database still get a full extraction.
+    markers_only = frozenset(path for path in track_paths if path in database)
+
+    present = []
+
+    for i, path in enumerate(track_paths):
+        if path in missing:
+            errors[i] = {'type': 'file_not_found', 'path': path, 'error': 'File not found'}
+
+            if track_keys is not None:
+                track_keys[path] = MISSING_FILE_KEY
+
+            if run_metrics:
+                run_metrics.add_track(path, None)
         else:
-            lookup_path = normalized_path
+            present.append(i)
+
+    schedule = [present[i] for i in locality.schedule([track_paths[i] for i in present], order, listings)]
+
+    def write_track(item):
+        path, track_data = item
+        children, attrs = track_element(path, track_data)
+        spool.add(path, children, **attrs)
+
+    bar = progress(None, total=len(schedule), desc="⚙️ (2/4) Processing tracks")
+
+    with track_pool(workers) as executor, pipeline.ConsumerThread(write_track, name="collection") as writer:
+        for start in range(0, len(schedule), TRACK_WINDOW):
+            window = schedule[start:start + TRACK_WINDOW]
+            window_paths = [track_paths[i] for i in window]
+
+            if cache:
+                results = process_tracks_cached(window_paths, workers, cache, track_keys, markers_only, prefetcher,
+                                                executor)
+            else:
+                results = process_tracks(window_paths, workers, markers_only, prefetcher, executor)
+
+            for i, path, (track_data, error, stats) in zip(window, window_paths, results):
+                bar.update()
+
+                if run_metrics:
+                    run_metrics.add_track(path, stats)
+
+                if error:
+                    errors[i] = error
+                    continue
+
+                if path in markers_only:
+                    apply_database_metadata(track_data, database[path])
+
+                writer.put((path, track_data))
+
+    bar.close()
+    unsuccessfulConversions.extend(errors[i] for i in sorted(errors))
 
-        track_to_crates[lookup_path].append(formatted_crate_name) 
-        all_track_paths_from_crates.add(lookup_path) 
+# Stage 3: crate name -> crate, in crate order, without crates none of whose
+# tracks converted. Like the playlist written for it, a name shared by two
+# crates keeps the first one's position and the last one's tracks.
+def structure_playlists(crate_index, converted):
+    playlists = {}
 
-all_tracks_in_tracks = {} 
+    for crate in progress(crate_index.crates,
+                            desc="⚙️ (3/4) Structuring Playlists"):
+        playlists[crate.name] = crate
 
-for full_system_path in tqdm(all_track_paths_from_crates, desc="⚙️ (2/4) Processing tracks"):
-    if not os.path.exists(full_system_path):
-        unsuccessfulConversions.append({'type': 'file_not_found', 'path': full_system_path, 'error': 'File not found'})
-        continue
+    return {
+        name: crate for name, crate in playlists.items()
+        if any(crate_index.track_paths[track_id] in converted for track_id in crate.track_ids)
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Convert a Serato DJ Pro library into a Rekordbox XML file.")
+    parser.add_argument("--serato-folder",
+                        help="path of the _Serato_ folder (default: look in the usual locations)")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="number of worker processes used to extract track metadata (0 = one per CPU core, default: 1)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_FILE,
+                        help=f"metadata cache file, reused across runs (default: {DEFAULT_CACHE_FILE})")
+    parser.add_argument("--no-cache", dest="cache", action="store_const", const=None,
+                        help="re-extract every track and do not read or write the metadata cache")
+    parser.add_argument("--evict-cache", action="store_true",
+                        help="remove cache entries for tracks that are no longer in any crate or have changed on disk")
+    parser.add_argument("--compact-xml", action="store_true",
+                        help="write the XML without indentation (smaller and faster to write)")
+    parser.add_argument("-i", "--incremental", action="store_true",
+                        help="only re-read crates and tracks that changed since the previous run and keep TrackIDs stable")
+    parser.add_argument("--use-database", action="store_true",
+                        help=f"take title, artist, BPM, key and length from Serato's '{serato_database.DATABASE_FILE}' file "
+                             "and only open audio files for hot cues and beatgrids")
+    parser.add_argument("--snapshot", default=snapshot.DEFAULT_SNAPSHOT_FILE,
+                        help=f"where the state of the last conversion is saved (default: {snapshot.DEFAULT_SNAPSHOT_FILE})")
+    parser.add_argument("--metrics", default=metrics.DEFAULT_METRICS_FILE,
+                        help=f"JSON report with timings, throughput and bytes read per stage (default: {metrics.DEFAULT_METRICS_FILE})")
+    parser.add_argument("--no-metrics", dest="metrics", action="store_const", const=None,
+                        help="do not write the metrics report")
+    parser.add_argument("--order", choices=locality.ORDERS, default=locality.DEFAULT_ORDER,
+                        help="order in which track files are read: by crate, by folder and name, by folder and inode, "
+                             f"or by physical position on disk (Linux only) (default: {locality.DEFAULT_ORDER})")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and update the XML incrementally whenever a crate or track changes")
+    parser.add_argument("--watch-poll", type=float, nargs="?", const=0.0, metavar="SECONDS",
+                        help="with --watch, look for changes every few seconds (or every SECONDS) instead of "
+                             "using inotify; needed for network shares")
+    parser.add_argument("--crate", action="append", default=[], metavar="PATTERN",
+                        help="only convert crates whose name matches PATTERN, a case-insensitive glob; "
+                             "subcrates are written Parent%%%%Child or Parent/Child and come along with their parent "
+                             "(can be repeated)")
+    parser.add_argument("--modified-since", metavar="DATE",
+                        help="only convert tracks whose file changed on or after DATE: YYYY-MM-DD, "
+                             "'YYYY-MM-DD HH:MM' or a number of days such as 7d")
+    parser.add_argument("--no-merge-duplicates", dest="merge_duplicates", action="store_false",
+                        help="do not merge crate paths that lead to the same file (for shares whose inode numbers "
+                             "are not reliable)")
+    parser.add_argument("--volume-map", action="append", default=[], metavar="FROM=TO",
+                        help="read tracks whose crate path starts with FROM from TO instead, e.g. /=/mnt/music for a "
+                             "library copied from another machine or /Volumes/USB=/media/usb (can be repeated)")
+    parser.add_argument("--find-moved", action="append", default=[], metavar="FOLDER",
+                        help="look for tracks that are missing at their crate path in FOLDER and its subfolders, "
+                             "by file name and size (can be repeated)")
+    parser.add_argument("--crate-threads", type=int, default=CRATE_THREADS, metavar="N",
+                        help=f"read up to N crate files at once (default: {CRATE_THREADS}, 1 reads them one by one)")
+    parser.add_argument("--prefetch", type=int, default=0, metavar="N",
+                        help="read the tags of up to N upcoming files per drive ahead in background threads; "
+                             "helps on USB hard drives and network shares (default: 0 = off)")
+    parser.add_argument("--prefetch-mount", action="append", default=[], metavar="MOUNT=N",
+                        help="read-ahead depth for the drive mounted at MOUNT, e.g. /Volumes/NAS=16 (can be repeated)")
+    parser.add_argument("--no-update-check", dest="update_check", action="store_false",
+                        help="do not check GitHub for a newer version")
+    args = parser.parse_args(argv)
+
+    if args.incremental and not args.cache:
+        parser.error("--incremental needs the metadata cache, it cannot be combined with --no-cache")
+
+    if args.incremental and (args.crate or args.modified_since):
+        parser.error("--incremental cannot be combined with --crate or --modified-since")
+
+    if args.watch and not args.cache:
+        parser.error("--watch updates the XML incrementally and needs the metadata cache, "
+                     "it cannot be combined with --no-cache")
+
+    if args.watch and (args.crate or args.modified_since):
+        parser.error("--watch cannot be combined with --crate or --modified-since")
+
+    if args.modified_since is not None:
+        try:
+            args.modified_since = selection.parse_since(args.modified_since)
+        except ValueError as e:
+            parser.error(f"--modified-since: {e}")
 
     try:
-        file_extension = os.path.splitext(full_system_path)[1].lower()
-        extracted_data = None
+        args.prefetch_mount = prefetch.parse_mount_depths(args.prefetch_mount)
+    except ValueError as e:
+        parser.error(f"--prefetch-mount: {e}")
 
-        if file_extension == '.mp3':
-            extracted_data = extract_mp3.extract_metadata(full_system_path)
+    try:
+        args.volume_map = path_resolver.parse_volume_maps(args.volume_map)
+    except ValueError as e:
+        parser.error(f"--volume-map: {e}")
 
-        elif file_extension == '.m4a':
-            extracted_data = extract_m4a.extract_metadata(full_system_path)
+    args.find_moved = [os.path.abspath(folder) for folder in args.find_moved]
 
-        elif file_extension == '.wav':
-            extracted_data = extract_wav.extract_metadata(full_system_path)
+    return args
 
-        else:
-            unsuccessfulConversions.append({'type': 'unsupported_format', 'path': full_system_path, 'error': f"Unsupported format: {file_extension}"})
-            continue
+### Main script ###
 
-        metadata = extracted_data.get('metadata', {})
-        hot_cues = extracted_data.get('hot_cues', [])
-        beatgrid = extracted_data.get('beatgrid')
+# Runs one conversion and returns a summary. Importing this module has no side
+# effects, so other tools can call convert() directly; main() adds the banner,
+# the update check and the command line.
+def convert(serato_folder=None, output_path=OUTPUT_FILE, workers=1, cache_path=DEFAULT_CACHE_FILE,
+            evict_cache=False, incremental=False, use_database=False,
+            snapshot_path=snapshot.DEFAULT_SNAPSHOT_FILE, metrics_path=metrics.DEFAULT_METRICS_FILE,
+            compact_xml=False, prefetch_depth=0, prefetch_mounts=None, order=locality.DEFAULT_ORDER,
+            crate_threads=CRATE_THREADS, crate_patterns=None, modified_since=None, merge_duplicates=True,
+            volume_maps=None, search_folders=None):
+    if incremental and not cache_path:
+        raise ValueError("incremental conversion needs the metadata cache")
 
-        all_tracks_in_tracks[full_system_path] = {
-            'file_location': full_system_path, 
-            'title': metadata.get('title', os.path.basename(full_system_path)), 
-            'artist': metadata.get('artist', 'Unknown Artist'), 
-            'bpm': metadata.get('bpm', 0.0),
-            'key': metadata.get('key', 'Unknown'), 
-            'totalTime_sec': metadata.get('duration_sec', 0), 
-            'hot_cues': hot_cues,
-            'beatgrid': beatgrid,
-            'sample_rate': metadata.get('sample_rate', 0)
-        }
+    # A filtered run only sees part of the library, so it neither compares
+    # against nor replaces the snapshot of the whole library.
+    filtered = bool(crate_patterns) or modified_since is not None
 
-    except Exception as e:
-        unsuccessfulConversions.append({'type': 'processing_error', 'path': full_system_path, 'error': f"{e}"})
+    if incremental and filtered:
+        raise ValueError("an incremental conversion cannot be limited to some crates or tracks")
+
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+
+    unsuccessfulConversions.clear()
+    summary = {"output_path": None, "tracks": 0, "converted": 0, "unsuccessful": [],
+               "serato_folder": None, "track_paths": []}
+
+    serato_base_path = serato_folder or find_serato_folder()
+
+    if not serato_base_path:
+        return summary
+
+    if not os.path.isdir(serato_base_path):
+        print(f"Error: Serato folder not found: {serato_base_path}")
+        return summary
+
+    summary["serato_folder"] = serato_base_path
+
+    serato_subcrates_path = os.path.join(serato_base_path, 'subcrates')
+
+    serato_crate_paths = find_serato_crates(serato_subcrates_path)
+
+    if not serato_crate_paths:
+        print("⚠️ No .crate files found in the subcrates folder.")
+        return summary
+
+    if crate_patterns:
+        all_crate_count = len(serato_crate_paths)
+        serato_crate_paths = selection.select_crates(serato_crate_paths, crate_patterns)
+        print(f"✅ {len(serato_crate_paths)} of {all_crate_count} crates match {', '.join(crate_patterns)}.\n")
+
+        if not serato_crate_paths:
+            return summary
+
+    previous = snapshot.load_snapshot(snapshot_path) if incremental else None
+
+    if incremental and previous is None:
+        print("⚠️ No usable snapshot of a previous conversion found, running a full conversion.\n")
+
+    previous_state = previous or snapshot.empty_snapshot()
+    run_metrics = metrics.RunMetrics()
+    cache = TrackCache(cache_path) if cache_path else None
+    resolver = path_resolver.PathResolver(volume_maps or (), search_folders or ())
+
+    with run_metrics.stage("crates") as stage:
+        crate_index, crate_records, crate_changes = read_crates(serato_crate_paths, previous_state["crates"], crate_threads)
+        stage.items = len(serato_crate_paths)
+        stage.extra["threads"] = crate_threads
 
+        resolved = resolver.resolve_all(crate_index.track_paths, cache.stored_size if cache else None)
+        if any(path != resolved_path for path, resolved_path in resolved.items()):
+            crate_index = crate_index.remap(resolved)
 
-processedSeratoFiles: "OrderedDict[str, list]" = OrderedDict()
+        stage.extra["paths"] = {"folder_reads": resolver.folder_reads, "stats": resolver.stats,
+                                "relocated": len(resolver.relocated), "missing": len(resolver.missing)}
 
-for crate_path in tqdm(serato_crate_paths,
-                        desc="⚙️ (3/4) Structuring Playlists"):
-    raw_name = os.path.basename(crate_path)[:-6]          # strip ".crate"
+        if resolver.relocated:
+            print(f"✅ {len(resolver.relocated)} tracks missing at their crate path were found in "
+                  f"{', '.join(resolver.search_folders)}.\n")
 
-    segments = raw_name.split("%%")
-    if len(segments) == 1:
-        crate_display_name = segments[0]                  # flat crate
+        if merge_duplicates:
+            path_count = len(crate_index.track_paths)
+            crate_index = crate_index.merge_duplicates(
+                file_identity.file_identities(crate_index.track_paths, resolver.listings))
+            duplicates = path_count - len(crate_index)
+            stage.extra["duplicate_paths"] = duplicates
+
+            if duplicates:
+                print(f"✅ {duplicates} track paths lead to a file already listed under another path; "
+                      "each file is converted once.\n")
+
+        if modified_since is not None:
+            all_track_count = len(crate_index)
+            crate_index = crate_index.select(lambda path: selection.modified_since(path, modified_since))
+            print(f"✅ {len(crate_index)} of {all_track_count} tracks were modified since "
+                  f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(modified_since))}.\n")
+            stage.extra["tracks_before_filter"] = all_track_count
+
+    track_paths = crate_index.track_paths
+    track_keys = {}
+    spool = collection_spool(compact_xml)
+    prefetcher = prefetch.Prefetcher(prefetch_depth, prefetch_mounts) if prefetch_depth or prefetch_mounts else None
+
+    with run_metrics.stage("tracks") as stage:
+        database = load_database(serato_base_path) if use_database else {}
+
+        if database:
+            # keyed by the paths the crates give, which may have been remapped or merged
+            database = {track_paths[crate_index.track_ids[path]]: record
+                        for path, record in database.items() if path in crate_index}
+
+            in_database = sum(1 for path in track_paths if path in database)
+            stage.extra["database_tracks"] = in_database
+            print(f"✅ Metadata for {in_database} / {len(track_paths)} tracks read from '{serato_database.DATABASE_FILE}'.\n")
+
+        convert_tracks(track_paths, spool, workers, cache, database, track_keys, run_metrics,
+                       prefetcher, order, resolver.missing,
+                       resolver.listings if file_identity.LIST_FOLDERS else None)
+        stage.extra["order"] = order
+        stage.items = len(track_paths)
+        stage.extra["converted"] = len(spool)
+        stage.extra["spooled_bytes"] = spool.position
+
+        if cache:
+            stage.extra["cache"] = {"hits": cache.hits, "misses": cache.misses}
+
+        if prefetcher:
+            stage.extra["prefetch_depths"] = {mount: prefetcher.depth_for(mount)
+                                              for mount in sorted(set(prefetcher.mounts.values()))}
+
+    if cache:
+        print(f"✅ Metadata cache: {cache.hits} reused, {cache.misses} extracted.")
+
+        if evict_cache and filtered:
+            print("⚠️ Cache eviction skipped: only part of the library was converted.")
+        elif evict_cache:
+            print(f"✅ Evicted {cache.evict_stale(track_paths)} stale cache entries.")
+
+        cache.close()
     else:
-        crate_display_name = segments[0] + "".join(
-            f" [{seg}]" for seg in segments[1:]
-        )
-
-    processedSeratoFiles[crate_display_name] = []
-
-    # Re-read paths *in crate order* so the playlist keeps Serato's sequence.
-    ordered_paths = extract_file_paths_from_crate(crate_path)
-
-    for p in ordered_paths:
-        # normalise path exactly the same way as earlier
-        norm = p.replace("\\", os.sep)
-        if platform.system() != "Windows" and not norm.startswith(os.sep):
-            norm = os.sep + norm
-
-        track_data = all_tracks_in_tracks.get(norm)
-        if track_data:
-            processedSeratoFiles[crate_display_name].append(track_data)
-
-# strip out any empty crates
-processedSeratoFiles = {
-    name: tracks for name, tracks in processedSeratoFiles.items() if tracks
-}
-
-if processedSeratoFiles:
-    generate_rekordbox_xml(processedSeratoFiles, all_tracks_in_tracks)
-
-else:
-    print("\nNo tracks were successfully processed. XML file not generated.")
-
-
-print("\n")
-print(f"✅ Found {len(all_track_paths_from_crates)} unique tracks across all crates.")
-print(f'✅ {str(len(all_track_paths_from_crates) - len(unsuccessfulConversions))} / {str(len(all_track_paths_from_crates))} tracks successfully converted.')
-print("\n")
-
-if unsuccessfulConversions:
-    print(f"⚠️ {len(unsuccessfulConversions)} Unsuccessful Conversions ({len(all_track_paths_from_crates) - len(all_tracks_in_tracks)} tracks failed).")
-    print("⚠️ The following items could not be processed and have not been included in the XML file:")
-
-    grouped_errors = {}
-    for item in unsuccessfulConversions:
-        error_type = item.get('type', 'unknown')
-        if error_type not in grouped_errors:
-            grouped_errors[error_type] = []
-        grouped_errors[error_type].append(item)
-
-    error_type_titles = {
-        'file_not_found': "Files Not Found:",
-        'unsupported_format': "Unsupported File Formats:",
-        'processing_error': "Errors During Track Processing:",
-        'beatgrid_parse_error': "Errors Parsing Beatgrid Data:",
-        'crate_read_error': "Errors Reading Crate Files:",
-        'crate_parse_error': "Errors Parsing Crate File Contents:",
-        'crate_decode_error': "Errors Decoding Paths in Crate Files:",
-        'crate_name_format_error': "Errors Formatting Crate/Playlist Names:", 
-        'unknown': "Other Errors:"
-    }
+        track_keys = {path: file_key(path) for path in track_paths}
 
-    sorted_error_types = sorted(grouped_errors.keys(), key=lambda x: list(error_type_titles.keys()).index(x) if x in error_type_titles else len(error_type_titles))
+    if previous:
+        report_incremental_changes(crate_changes, previous["crates"], crate_records,
+                                   snapshot.diff_tracks(previous["tracks"], track_keys))
 
-    for error_type in sorted_error_types:
-        title = error_type_titles.get(error_type, error_type + ":") 
-        print(f"\n{title}")
-        for item in grouped_errors[error_type]:
-            item_path = item.get('path', 'N/A')
-            item_error = item.get('error', 'No details')
 
-            if error_type in ['file_not_found', 'unsupported_format', 'processing_error', 'beatgrid_parse_error']:
+    with run_metrics.stage("playlists") as stage:
+        playlists = structure_playlists(crate_index, spool)
+        stage.items = len(playlists)
 
-                filename = os.path.basename(item_path)
+    if playlists:
+        track_ids = None
+        if previous:
+            converted_paths = [path for path in track_paths if path in spool]
+            track_ids = snapshot.assign_track_ids(converted_paths, previous["track_ids"])
 
-                crates_for_file = track_to_crates.get(item_path, [])
-                crate_display = ", ".join(crates_for_file) if crates_for_file else "Unknown Crate"
+        with run_metrics.stage("xml") as stage:
+            track_id_map = generate_rekordbox_xml(playlists, crate_index, spool, track_ids,
+                                                  output_path=output_path, compact=compact_xml)
+            stage.items = len(track_id_map)
+            stage.extra["bytes_written"] = os.path.getsize(output_path)
 
-                if "not a MP4 file" in item_error:
-                    item_error = "File appears to be invalid or corrupt"
+        summary["output_path"] = output_path
 
-                print(f'- "{filename}" ({crate_display}): {item_error}')
+        # Keep the IDs of tracks that are still in a crate but failed this time,
+        # so they get the same TrackID back once they convert again.
+        saved_ids = {path: tid for path, tid in previous_state["track_ids"].items()
+                     if path in crate_index}
+        saved_ids.update(track_id_map)
 
-            elif error_type in ['crate_read_error', 'crate_parse_error', 'crate_decode_error', 'crate_name_format_error']:
+        if not filtered:
+            snapshot.save_snapshot(snapshot_path, crate_records, track_keys, saved_ids)
 
-                 crate_filename = os.path.basename(item_path)
-                 print(f'- Crate "{crate_filename}": {item_error}')
+    else:
+        print("\nNo tracks were successfully processed. XML file not generated.")
+
+    spool.close()
+
+    if metrics_path:
+        run_metrics.save(metrics_path, version=current_version, serato_folder=serato_base_path,
+                         workers=workers, cache=bool(cache), incremental=incremental,
+                         use_database=use_database, tracks=len(crate_index), filtered=filtered,
+                         failed=len(unsuccessfulConversions))
+
+    print("\n")
+    print(f"✅ Found {len(crate_index)} unique tracks across {'the selected' if filtered else 'all'} crates.")
+    print(f'✅ {str(len(crate_index) - len(unsuccessfulConversions))} / {str(len(crate_index))} tracks successfully converted.')
+    print("\n")
+
+    if unsuccessfulConversions:
+        print(f"⚠️ {len(unsuccessfulConversions)} Unsuccessful Conversions ({len(crate_index) - len(spool)} tracks failed).")
+        print("⚠️ The following items could not be processed and have not been included in the XML file:")
+
+        grouped_errors = {}
+        for item in unsuccessfulConversions:
+            error_type = item.get('type', 'unknown')
+            if error_type not in grouped_errors:
+                grouped_errors[error_type] = []
+            grouped_errors[error_type].append(item)
+
+        error_type_titles = {
+            'file_not_found': "Files Not Found:",
+            'unsupported_format': "Unsupported File Formats:",
+            'processing_error': "Errors During Track Processing:",
+            'beatgrid_parse_error': "Errors Parsing Beatgrid Data:",
+            'crate_read_error': "Errors Reading Crate Files:",
+            'crate_parse_error': "Errors Parsing Crate File Contents:",
+            'crate_decode_error': "Errors Decoding Paths in Crate Files:",
+            'crate_name_format_error': "Errors Formatting Crate/Playlist Names:", 
+            'unknown': "Other Errors:"
+        }
+
+        sorted_error_types = sorted(grouped_errors.keys(), key=lambda x: list(error_type_titles.keys()).index(x) if x in error_type_titles else len(error_type_titles))
+
+        for error_type in sorted_error_types:
+            title = error_type_titles.get(error_type, error_type + ":") 
+            print(f"\n{title}")
+            for item in grouped_errors[error_type]:
+                item_path = item.get('path', 'N/A')
+                item_error = item.get('error', 'No details')
+
+                if error_type in ['file_not_found', 'unsupported_format', 'processing_error', 'beatgrid_parse_error']:
+
+                    filename = os.path.basename(item_path)
+
+                    crates_for_file = crate_index.crate_names_for(item_path)
+                    crate_display = ", ".join(crates_for_file) if crates_for_file else "Unknown Crate"
+
+                    if "not a MP4 file" in item_error:
+                        item_error = "File appears to be invalid or corrupt"
+
+                    print(f'- "{filename}" ({crate_display}): {item_error}')
+
+                elif error_type in ['crate_read_error', 'crate_parse_error', 'crate_decode_error', 'crate_name_format_error']:
+
+                     crate_filename = os.path.basename(item_path)
+                     print(f'- Crate "{crate_filename}": {item_error}')
+
+                else: 
+                     print(f'- Item "{item_path}": {item_error}')
+
+    else:
+        print("\n✅ All tracks successfully processed.")
+
+    summary["tracks"] = len(crate_index)
+    summary["converted"] = len(spool)
+    summary["unsuccessful"] = list(unsuccessfulConversions)
+    summary["track_paths"] = crate_index.track_paths
+    return summary
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    print(BANNER)
+    print("\nVersion 1.3\n\n")
+
+    # Never blocks: a result from the last day is shown right away, otherwise
+    # GitHub is asked in the background and the answer shown after the conversion.
+    update_check = UpdateCheck(current_version).start() if args.update_check else None
+    if update_check:
+        update_check.report()
+
+    convert_args = dict(serato_folder=args.serato_folder, workers=args.workers, cache_path=args.cache,
+                        evict_cache=args.evict_cache, use_database=args.use_database, snapshot_path=args.snapshot,
+                        metrics_path=args.metrics, compact_xml=args.compact_xml, prefetch_depth=args.prefetch,
+                        prefetch_mounts=args.prefetch_mount, order=args.order, crate_threads=args.crate_threads,
+                        merge_duplicates=args.merge_duplicates, volume_maps=args.volume_map,
+                        search_folders=args.find_moved)
+
+    if args.watch:
+        import watch
+        watch.run(convert, poll=args.watch_poll is not None,
+                  interval=args.watch_poll or watch.POLL_INTERVAL, **convert_args)
+    else:
+        convert(incremental=args.incremental, crate_patterns=args.crate, modified_since=args.modified_since,
+                **convert_args)
 
-            else: 
-                 print(f'- Item "{item_path}": {item_error}')
+    if update_check:
+        update_check.report()
 
-else:
-    print("\n✅ All tracks successfully processed.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import mmap
+import os
+import struct
+
+# A .crate file is a flat list of Serato TLV records (see serato_database):
+#   vrsn  UTF-16BE version string
+#   osrt  sorting: tvcn (column name), brev (reverse flag)
+#   ovct  one per visible column: tvcn (column name), tvcw (width)
+#   otrk  one per track, in crate order: ptrk (volume-relative path)
+# The file is memory-mapped and walked with struct.unpack_from, so only the
+# values actually decoded are ever copied out of it.
+HEADER = struct.Struct(">4sI")
+
+
+class CrateError(Exception):
+    pass
+
+
+def decode_text(value):
+    return value.decode("utf-16-be", errors="replace").rstrip("\x00")
+
+
+class CrateFile:
+    # The header records (version, sorting, columns) are decoded when the
+    # crate is opened; track paths are decoded one at a time by iter_paths(),
+    # so an "All tracks" crate needs no more memory than the path at hand.
+
+    def __init__(self, buffer, path=None):
+        self.path = path
+        self.buffer = buffer
+        self.version = None
+        self.sort_column = None
+        self.sort_reverse = False
+        self.columns = []           # (column name, width) in display order
+        self.undecodable = []       # offsets of ptrk values that are not valid UTF-16
+        self.tracks_start = self.read_header()
+
+    @classmethod
+    def open(cls, path):
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return cls(b"", path)   # an empty file cannot be mapped
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            return cls(buffer, path)
+        except Exception:
+            buffer.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+    def iter_records(self, start=0, end=None):
+        # (tag, value start, value end) for the records in buffer[start:end]
+        buffer = self.buffer
+        position = start
+        end = len(buffer) if end is None else end
+
+        while position + HEADER.size <= end:
+            tag, length = HEADER.unpack_from(buffer, position)
+            position += HEADER.size
+
+            if position + length > end:
+                raise CrateError(f"record {tag!r} at byte {position - HEADER.size} runs past the end of its parent")
+
+            yield tag, position, position + length
+            position += length
+
+    def read_header(self):
+        # Decodes everything before the first otrk record and returns its offset.
+        buffer = self.buffer
+
+        for tag, start, end in self.iter_records():
+            if tag == b"otrk":
+                return start - HEADER.size
+
+            if tag == b"vrsn":
+                self.version = decode_text(buffer[start:end])
+
+            elif tag == b"osrt":
+                for field, value_start, value_end in self.iter_records(start, end):
+                    if field == b"tvcn":
+                        self.sort_column = decode_text(buffer[value_start:value_end])
+                    elif field == b"brev" and value_end > value_start:
+                        self.sort_reverse = buffer[value_start] != 0
+
+            elif tag == b"ovct":
+                name = width = None
+                for field, value_start, value_end in self.iter_records(start, end):
+                    if field == b"tvcn":
+                        name = decode_text(buffer[value_start:value_end])
+                    elif field == b"tvcw":
+                        width = decode_text(buffer[value_start:value_end])
+                self.columns.append((name, width))
+
+        return len(buffer)
+
+    def iter_paths(self):
+        # Track paths in crate order, as stored (volume-relative). Values
+        # that are not valid UTF-16 are skipped and their offsets recorded in
+        # self.undecodable; a truncated record raises CrateError.
+        buffer = self.buffer
+
+        for tag, start, end in self.iter_records(self.tracks_start):
+            if tag != b"otrk":
+                continue
+
+            for field, value_start, value_end in self.iter_records(start, end):
+                if field != b"ptrk":
+                    continue
+
+                try:
+                    yield buffer[value_start:value_end].decode("utf-16-be")
+                except UnicodeDecodeError:
+                    self.undecodable.append(value_start)
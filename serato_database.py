@@ -0,0 +1,134 @@
+import os
+import struct
+
+from crate_index import normalize_track_path
+
+DATABASE_FILE = "database V2"
+
+# Serato TLV records: 4-byte tag, 4-byte big-endian length, value. The first
+# letter of the tag gives the value type:
+#   o = nested records, t = UTF-16BE text, p = UTF-16BE path,
+#   u = u32, s = u16, b = single byte flag
+TEXT_TYPES = ("t", "p")
+
+# Fields used for the Rekordbox collection; everything else in an otrk record
+# (album, genre, comments, play counts, ...) is skipped without decoding.
+TRACK_FIELDS = ("pfil", "tsng", "tart", "tbpm", "tkey", "tlen")
+
+# Large enough to hold thousands of otrk records, so the file is read
+# sequentially in a handful of big reads.
+READ_BUFFER_SIZE = 1 << 20
+
+
+class DatabaseError(Exception):
+    pass
+
+
+def iter_fields(data, start=0, end=None):
+    # (tag, value) pairs of the TLV records in data[start:end]; values are
+    # memoryview slices, so nothing is copied until a field is decoded.
+    view = memoryview(data)
+    position = start
+    end = len(data) if end is None else end
+
+    while position + 8 <= end:
+        tag, length = struct.unpack_from(">4sI", view, position)
+        position += 8
+
+        if position + length > end:
+            raise DatabaseError(f"record {tag!r} runs past the end of its parent")
+
+        yield tag.decode("latin-1"), view[position:position + length]
+        position += length
+
+
+def decode_value(tag, value):
+    kind = tag[0]
+
+    if kind in TEXT_TYPES:
+        return bytes(value).decode("utf-16-be", errors="replace").rstrip("\x00")
+    if kind == "u" and len(value) == 4:
+        return struct.unpack(">I", value)[0]
+    if kind == "s" and len(value) == 2:
+        return struct.unpack(">H", value)[0]
+    if kind == "b" and len(value) == 1:
+        return value[0] != 0
+    if kind == "o":
+        return {field: decode_value(field, inner) for field, inner in iter_fields(value)}
+
+    return bytes(value)
+
+
+def iter_records(fileobj):
+    # Top level (tag, payload) records, read one at a time.
+    while True:
+        header = fileobj.read(8)
+        if len(header) < 8:
+            return
+
+        tag, length = struct.unpack(">4sI", header)
+        payload = fileobj.read(length)
+
+        if len(payload) < length:
+            raise DatabaseError(f"truncated {tag.decode('latin-1')!r} record")
+
+        yield tag.decode("latin-1"), payload
+
+
+def iter_tracks(database_path, fields=TRACK_FIELDS):
+    # One sequential pass over the database; yields a dict with the decoded
+    # wanted fields of every otrk record.
+    wanted = set(fields)
+
+    with open(database_path, "rb", buffering=READ_BUFFER_SIZE) as f:
+        for tag, payload in iter_records(f):
+            if tag != "otrk":
+                continue
+
+            yield {field: decode_value(field, value)
+                   for field, value in iter_fields(payload) if field in wanted}
+
+
+def parse_length(text):
+    # "mm:ss.xx" (minutes may exceed 59) or "hh:mm:ss.xx" -> seconds
+    try:
+        seconds = 0.0
+        for part in text.split(":"):
+            seconds = seconds * 60 + float(part)
+    except ValueError:
+        return 0
+
+    return round(seconds, 3)
+
+
+def parse_bpm(text):
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def find_database(serato_base_path):
+    database_path = os.path.join(serato_base_path, DATABASE_FILE)
+    return database_path if os.path.isfile(database_path) else None
+
+
+def read_database(database_path):
+    # Returns track path (normalized like crate paths) -> raw metadata fields.
+    # Keys are converted by the caller, which owns the Camelot mapping.
+    tracks = {}
+
+    for record in iter_tracks(database_path):
+        path = record.get("pfil")
+        if not path:
+            continue
+
+        tracks[normalize_track_path(path)] = {
+            "title": record.get("tsng"),
+            "artist": record.get("tart"),
+            "bpm": parse_bpm(record.get("tbpm")),
+            "key": record.get("tkey"),
+            "duration_sec": parse_length(record.get("tlen", "")),
+        }
+
+    return tracks
@@ -0,0 +1,76 @@
+import hashlib
+import json
+import os
+import time
+
+SNAPSHOT_VERSION = 1
+DEFAULT_SNAPSHOT_FILE = "serato2rekordbox.snapshot.json"
+
+# A snapshot records what the previous conversion saw, so the next run can tell
+# which crates and tracks changed and keep TrackIDs stable:
+#
+#   crates:    crate file path -> {"size", "mtime_ns", "sha1", "tracks": [paths in crate order]}
+#   tracks:    track path -> [size, mtime_ns]
+#   track_ids: track path -> TrackID used in the XML
+
+
+def empty_snapshot():
+    return {"version": SNAPSHOT_VERSION, "created": None, "crates": {}, "tracks": {}, "track_ids": {}}
+
+
+def load_snapshot(snapshot_path):
+    try:
+        with open(snapshot_path, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        return None
+
+    return snapshot
+
+
+def save_snapshot(snapshot_path, crates, tracks, track_ids):
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "created": time.time(),
+        "crates": crates,
+        "tracks": {path: list(key) for path, key in tracks.items()},
+        "track_ids": track_ids,
+    }
+
+    tmp_path = snapshot_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, snapshot_path)
+
+
+def content_hash(blob):
+    return hashlib.sha1(blob).hexdigest()
+
+
+def assign_track_ids(track_paths, previous_ids):
+    # Tracks seen in the previous run keep their TrackID; new tracks get fresh
+    # IDs above the highest one in that run, so existing IDs never move.
+    track_ids = {}
+    next_id = max(previous_ids.values(), default=0) + 1
+
+    for path in track_paths:
+        if path in previous_ids:
+            track_ids[path] = previous_ids[path]
+
+    for path in track_paths:
+        if path not in track_ids:
+            track_ids[path] = next_id
+            next_id += 1
+
+    return track_ids
+
+
+def diff_tracks(previous_tracks, current_tracks):
+    added = [path for path in current_tracks if path not in previous_tracks]
+    removed = [path for path in previous_tracks if path not in current_tracks]
+    modified = [path for path, key in current_tracks.items()
+                if path in previous_tracks and tuple(previous_tracks[path]) != tuple(key)]
+    return added, removed, modified
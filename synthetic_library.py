@@ -0,0 +1,292 @@
+import argparse
+import base64
+import os
+import random
+import struct
+
+# Builds a synthetic _Serato_ folder plus music files for benchmarking: nested
+# %% subcrates with ptrk paths, a database V2 file, and small but realistic
+# MP3/M4A/WAV files whose tags carry cover art, the Serato Overview waveform
+# and Serato Markers2/BeatGrid payloads. A few crate entries point to missing
+# or unsupported files, like in a real library.
+
+AUDIO_FORMATS = (".mp3", ".m4a", ".wav")
+CUE_COLORS = [(0xCC, 0x00, 0x00), (0xCC, 0x44, 0x00), (0xCC, 0x88, 0x00), (0xCC, 0xCC, 0x00),
+              (0x00, 0xCC, 0x00), (0x00, 0xCC, 0xCC), (0x00, 0x00, 0xCC), (0xCC, 0x00, 0xCC)]
+KEYS = ["C", "Am", "G", "Em", "D", "Bm", "A", "F#m", "E", "C#m", "Bb", "Gm", "F", "Dm", "Eb", "Cm"]
+GENRES = ["House", "Techno", "Disco", "Garage", "Hip Hop", "Drum & Bass", "Ambient", "Funk"]
+
+MP3_FRAME_HEADER = b"\xff\xfb\x90\x64"         # MPEG-1 Layer III, 128 kbps, 44.1 kHz
+MP3_FRAME_LENGTH = 417
+
+
+def serato_b64(data: bytes) -> bytes:
+    # Serato writes unpadded base64 wrapped at 72 characters
+    encoded = base64.b64encode(data).rstrip(b"=")
+    return b"\n".join(encoded[i:i + 72] for i in range(0, len(encoded), 72))
+
+
+def tlv(tag: bytes, payload: bytes) -> bytes:
+    return tag + struct.pack(">I", len(payload)) + payload
+
+
+def utf16(text: str) -> bytes:
+    return text.encode("utf-16-be")
+
+
+def markers2_payload(cues) -> bytes:
+    entries = tlv(b"COLOR\x00", b"\x00\xff\xff\xff")
+
+    for index, position_ms, (r, g, b), name in cues:
+        body = (b"\x00" + bytes([index]) + struct.pack(">I", position_ms) + b"\x00"
+                + bytes([r, g, b]) + b"\x00\x00" + name.encode("utf-8") + b"\x00")
+        entries += b"CUE\x00" + struct.pack(">I", len(body)) + body
+
+    entries += tlv(b"BPMLOCK\x00", b"\x00")
+    return b"\x01\x01" + entries + b"\x00"
+
+
+def beatgrid_payload(markers, footer: int = 0) -> bytes:
+    body = b"\x01\x00" + struct.pack(">I", len(markers))
+
+    for i, (position, value) in enumerate(markers):
+        if i == len(markers) - 1:
+            body += struct.pack(">ff", position, value)
+        else:
+            body += struct.pack(">fI", position, value)
+
+    return body + bytes([footer])
+
+
+def id3_frame(frame_id: bytes, payload: bytes) -> bytes:
+    size = len(payload)
+    syncsafe = ((size & 0x7F) | ((size & 0x3F80) << 1) | ((size & 0x1FC000) << 2) | ((size & 0xFE00000) << 3))
+    return frame_id + struct.pack(">I", syncsafe) + b"\x00\x00" + payload
+
+
+def id3_tag(track, art_size: int) -> bytes:
+    frames = b"".join([
+        id3_frame(b"TIT2", b"\x03" + track["title"].encode("utf-8")),
+        id3_frame(b"TPE1", b"\x03" + track["artist"].encode("utf-8")),
+        id3_frame(b"TBPM", b"\x03" + ("%d" % round(track["bpm"])).encode("ascii")),
+        id3_frame(b"TKEY", b"\x03" + track["key"].encode("utf-8")),
+        id3_frame(b"APIC", b"\x00image/jpeg\x00\x03\x00" + bytes(art_size)),
+        id3_frame(b"GEOB", b"\x00application/octet-stream\x00\x00Serato Overview\x00" + bytes(3842)),
+        id3_frame(b"GEOB", b"\x00application/octet-stream\x00\x00Serato Markers2\x00"
+                  + b"\x01\x01" + serato_b64(markers2_payload(track["cues"]))),
+        id3_frame(b"GEOB", b"\x00application/octet-stream\x00\x00Serato BeatGrid\x00"
+                  + beatgrid_payload(track["grid"])),
+    ])
+    size = len(frames)
+    syncsafe = bytes([(size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F])
+    return b"ID3\x04\x00\x00" + syncsafe + frames
+
+
+def build_mp3(track, art_size: int, frames: int) -> bytes:
+    audio = (MP3_FRAME_HEADER + bytes(MP3_FRAME_LENGTH - 4)) * frames
+    return id3_tag(track, art_size) + audio
+
+
+def build_wav(track, art_size: int, seconds: float) -> bytes:
+    sample_rate, channels, bits = 44100, 2, 16
+    block_align = channels * bits // 8
+    data = bytes(int(sample_rate * seconds) * block_align)
+    fmt = struct.pack("<HHIIHH", 1, channels, sample_rate, sample_rate * block_align, block_align, bits)
+    tag = id3_tag(track, art_size)
+    if len(tag) % 2:
+        tag += b"\x00"
+    body = b"WAVE" + b"fmt " + struct.pack("<I", len(fmt)) + fmt
+    body += b"data" + struct.pack("<I", len(data)) + data
+    body += b"id3 " + struct.pack("<I", len(tag)) + tag
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+def atom(name: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I", len(payload) + 8) + name + payload
+
+
+def full_atom(name: bytes, payload: bytes, version: int = 0, flags: int = 0) -> bytes:
+    return atom(name, struct.pack(">I", (version << 24) | flags) + payload)
+
+
+def ilst_data(name: bytes, data_type: int, value: bytes) -> bytes:
+    return atom(name, atom(b"data", struct.pack(">II", data_type, 0) + value))
+
+
+def ilst_freeform(mean: str, name: str, value: bytes) -> bytes:
+    return atom(b"----", full_atom(b"mean", mean.encode("utf-8"))
+                + full_atom(b"name", name.encode("utf-8"))
+                + atom(b"data", struct.pack(">II", 1, 0) + value))
+
+
+def build_m4a(track, art_size: int, seconds: float) -> bytes:
+    sample_rate = 44100
+    duration = int(sample_rate * seconds)
+
+    mvhd = full_atom(b"mvhd", struct.pack(">IIII", 0, 0, 1000, int(seconds * 1000)) + bytes(80))
+    mdhd = full_atom(b"mdhd", struct.pack(">IIIIHH", 0, 0, sample_rate, duration, 0x55C4, 0))
+    hdlr = full_atom(b"hdlr", b"\x00\x00\x00\x00soun" + bytes(12) + b"SoundHandler\x00")
+    # AudioSpecificConfig: AAC LC, 44.1 kHz, stereo
+    asc = bytes([0x12, 0x10])
+    dec_config = b"\x04" + bytes([13 + 2 + len(asc)]) + b"\x40\x15" + bytes(3) + struct.pack(">II", 128000, 128000) + b"\x05" + bytes([len(asc)]) + asc
+    es_desc = b"\x03" + bytes([3 + len(dec_config) + 3]) + b"\x00\x01\x00" + dec_config + b"\x06\x01\x02"
+    esds = full_atom(b"esds", es_desc)
+    mp4a = atom(b"mp4a", bytes(6) + struct.pack(">H", 1) + bytes(8)
+                + struct.pack(">HHHHI", 2, 16, 0, 0, sample_rate << 16) + esds)
+    stsd = full_atom(b"stsd", struct.pack(">I", 1) + mp4a)
+    stbl = atom(b"stbl", stsd)
+    minf = atom(b"minf", full_atom(b"smhd", bytes(4)) + stbl)
+    trak = atom(b"trak", atom(b"mdia", mdhd + hdlr + minf))
+
+    # Serato's MP4 beatgrid value carries one trailing junk character after the base64 data
+    beatgrid = base64.b64encode(b"application/octet-stream\x00\x00Serato BeatGrid\x00"
+                                + beatgrid_payload(track["grid"])).rstrip(b"=") + b"A"
+    markers = base64.b64encode(b"application/octet-stream\x00\x00Serato Markers2\x00"
+                               + b"\x01\x01" + serato_b64(markers2_payload(track["cues"])))
+    ilst = atom(b"ilst", b"".join([
+        ilst_data(b"\xa9nam", 1, track["title"].encode("utf-8")),
+        ilst_data(b"\xa9ART", 1, track["artist"].encode("utf-8")),
+        ilst_data(b"tmpo", 21, struct.pack(">H", round(track["bpm"]))),
+        ilst_data(b"covr", 13, bytes(art_size)),
+        ilst_freeform("com.apple.iTunes", "initialkey", track["key"].encode("utf-8")),
+        ilst_freeform("com.serato.dj", "markersv2", markers),
+        ilst_freeform("com.serato.dj", "beatgrid", beatgrid),
+    ]))
+    meta = full_atom(b"meta", full_atom(b"hdlr", b"\x00\x00\x00\x00mdirappl" + bytes(9)) + ilst)
+    moov = atom(b"moov", mvhd + trak + atom(b"udta", meta))
+    ftyp = atom(b"ftyp", b"M4A \x00\x00\x02\x00M4A isomiso2")
+    return ftyp + moov + atom(b"mdat", bytes(2048))
+
+
+def make_track(rng: random.Random, number: int):
+    bpm = round(rng.uniform(84.0, 174.0), 2)
+    first_beat = round(rng.uniform(0.0, 0.5), 3)
+    if rng.random() < 0.1:
+        # live-drummer style grid with drifting tempo markers
+        grid = []
+        position = first_beat
+        for _ in range(rng.randint(3, 40)):
+            grid.append((position, 16))
+            position += 16 * 60.0 / (bpm + rng.uniform(-2.0, 2.0))
+        grid.append((position, bpm))
+    else:
+        grid = [(first_beat, bpm)]
+
+    cues = []
+    for index in sorted(rng.sample(range(8), rng.randint(0, 5))):
+        name = rng.choice(["", "Drop", "Intro", "Vocal", "Break", "Outro"])
+        cues.append((index, rng.randint(0, 300000), rng.choice(CUE_COLORS), name))
+
+    return {
+        "title": "Track %06d" % number,
+        "artist": "Artist %d" % rng.randint(1, max(1, number // 8 + 1)),
+        "bpm": bpm,
+        "key": rng.choice(KEYS),
+        "cues": cues,
+        "grid": grid,
+    }
+
+
+def crate_bytes(paths) -> bytes:
+    blob = tlv(b"vrsn", utf16("1.0/Serato ScratchLive Crate"))
+    blob += tlv(b"osrt", tlv(b"tvcn", utf16("song")) + tlv(b"brev", b"\x00"))
+    for column, width in (("song", "0"), ("artist", "0"), ("bpm", "0"), ("key", "0")):
+        blob += tlv(b"ovct", tlv(b"tvcn", utf16(column)) + tlv(b"tvcw", utf16(width)))
+    for path in paths:
+        blob += tlv(b"otrk", tlv(b"ptrk", utf16(path)))
+    return blob
+
+
+def database_bytes(records) -> bytes:
+    blob = tlv(b"vrsn", utf16("2.0/Serato Scratch LIVE Database"))
+    for path, track, seconds in records:
+        minutes, secs = divmod(seconds, 60)
+        fields = [
+            tlv(b"ttyp", utf16(os.path.splitext(path)[1][1:])),
+            tlv(b"pfil", utf16(path)),
+            tlv(b"tsng", utf16(track["title"])),
+            tlv(b"tart", utf16(track["artist"])),
+            tlv(b"tlen", utf16("%02d:%05.2f" % (minutes, secs))),
+            tlv(b"tbpm", utf16("%d.00" % round(track["bpm"]))),   # same value as the file tags
+            tlv(b"tkey", utf16(track["key"])),
+            tlv(b"uadd", struct.pack(">I", 1700000000)),
+            tlv(b"bmis", b"\x00"),
+        ]
+        blob += tlv(b"otrk", b"".join(fields))
+    return blob
+
+
+def generate_library(root: str, tracks: int, seed: int = 1, art_size: int = 64 * 1024,
+                     missing_ratio: float = 0.005, unsupported_ratio: float = 0.002) -> str:
+    rng = random.Random(seed)
+    serato_folder = os.path.join(root, "_Serato_")
+    subcrates = os.path.join(serato_folder, "subcrates")
+    music = os.path.join(root, "music")
+    os.makedirs(subcrates, exist_ok=True)
+
+    crate_relative_paths = []
+    database_records = []
+
+    for number in range(tracks):
+        track = make_track(rng, number)
+        folder = os.path.join(music, GENRES[number % len(GENRES)], "Batch %03d" % (number // 500))
+        os.makedirs(folder, exist_ok=True)
+
+        roll = rng.random()
+        if roll < unsupported_ratio:
+            path = os.path.join(folder, "%s.flac" % track["title"])
+            with open(path, "wb") as f:
+                f.write(b"fLaC")
+        else:
+            extension = AUDIO_FORMATS[number % len(AUDIO_FORMATS)]
+            path = os.path.join(folder, "%s - %s%s" % (track["artist"], track["title"], extension))
+            if roll >= unsupported_ratio + missing_ratio:
+                if extension == ".mp3":
+                    blob = build_mp3(track, art_size, frames=40)
+                    seconds = 40 * 1152 / 44100
+                elif extension == ".m4a":
+                    blob = build_m4a(track, art_size, seconds=1.0)
+                    seconds = 1.0
+                else:
+                    blob = build_wav(track, art_size, seconds=0.25)
+                    seconds = 0.25
+                with open(path, "wb") as f:
+                    f.write(blob)
+                database_records.append((os.path.abspath(path).lstrip("/"), track, seconds))
+
+        crate_relative_paths.append(os.path.abspath(path).lstrip(os.sep))
+
+    crate_count = max(1, tracks // 40)
+    names = []
+    for i in range(crate_count):
+        genre = GENRES[i % len(GENRES)]
+        depth = rng.choice([1, 1, 2, 3])
+        name = genre if depth == 1 else "%%".join([genre] + ["Sub %d" % rng.randint(1, 4) for _ in range(depth - 1)])
+        if name in names:
+            name += "%%" + "Set %d" % i
+        names.append(name)
+
+    contents = {name: [] for name in names}
+    for path in crate_relative_paths:
+        for name in rng.sample(names, min(len(names), rng.choice([1, 1, 2, 3]))):
+            contents[name].append(path)
+
+    for name in names:
+        with open(os.path.join(subcrates, name + ".crate"), "wb") as f:
+            f.write(crate_bytes(contents[name]))
+
+    with open(os.path.join(serato_folder, "database V2"), "wb") as f:
+        f.write(database_bytes(database_records))
+
+    return serato_folder
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic Serato library for benchmarking.")
+    parser.add_argument("root", help="directory to create the library in")
+    parser.add_argument("--tracks", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--art-size", type=int, default=64 * 1024)
+    args = parser.parse_args()
+
+    print(generate_library(args.root, args.tracks, seed=args.seed, art_size=args.art_size))
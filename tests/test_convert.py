@@ -0,0 +1,50 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import serato2rekordbox
+from synthetic_library import generate_library
+
+
+class ConvertTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.library = os.path.join(self.root, "library")
+        self.serato_folder = generate_library(self.library, 40, seed=3, art_size=256)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def convert(self, **kwargs):
+        metrics_path = os.path.join(self.root, "metrics.json")
+        summary = serato2rekordbox.convert(serato_folder=self.serato_folder,
+                                           output_path=os.path.join(self.root, "out.xml"),
+                                           cache_path=None, metrics_path=metrics_path,
+                                           snapshot_path=os.path.join(self.root, "snapshot.json"), **kwargs)
+        with open(metrics_path, encoding="utf-8") as f:
+            return summary, json.load(f)
+
+    def test_database_survives_volume_map_and_modified_since(self):
+        # The database is keyed by the crate paths, which the volume map turns
+        # into aliases; selecting by modification time must keep them.
+        moved = os.path.join(self.root, "moved")
+        os.rename(os.path.join(self.library, "music"), moved)
+        volume_maps = serato2rekordbox.path_resolver.parse_volume_maps(
+            [f"{os.path.join(self.library, 'music')}={moved}"])
+
+        summary, metrics = self.convert(use_database=True, volume_maps=volume_maps)
+        expected = metrics["stages"]["tracks"]["database_tracks"]
+        self.assertGreater(expected, 0)
+        self.assertTrue(all(path.startswith(moved) for path in summary["track_paths"]))
+
+        summary, metrics = self.convert(use_database=True, volume_maps=volume_maps, modified_since=0)
+        self.assertEqual(metrics["stages"]["tracks"]["database_tracks"], expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import io
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mutagen.id3 import ID3
+
+import extract_mp3
+import id3_reader
+from synthetic_library import MP3_FRAME_HEADER, MP3_FRAME_LENGTH, id3_frame
+
+
+def syncsafe(size):
+    return bytes([(size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F])
+
+
+def v23_frame(frame_id, payload):
+    return frame_id + struct.pack(">I", len(payload)) + b"\x00\x00" + payload
+
+
+def tag(major, flags, body):
+    return b"ID3" + bytes([major, 0, flags]) + syncsafe(len(body)) + body
+
+
+TEXT = {"TIT2": "Café", "TPE1": "Ünïcode Artist", "TKEY": "F#m"}
+
+# one frame per text encoding: 0 latin-1, 1 UTF-16 with BOM, 3 UTF-8
+ENCODED_FRAMES = (id3_frame(b"TIT2", b"\x00" + TEXT["TIT2"].encode("latin-1"))
+                  + id3_frame(b"TPE1", b"\x01" + TEXT["TPE1"].encode("utf-16") + b"\x00\x00")
+                  + id3_frame(b"TKEY", b"\x03" + TEXT["TKEY"].encode("utf-8")))
+
+
+class ID3ReaderTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def mp3(self, tag_bytes):
+        path = os.path.join(self.root, "track.mp3")
+        with open(path, "wb") as f:
+            f.write(tag_bytes + (MP3_FRAME_HEADER + bytes(MP3_FRAME_LENGTH - 4)) * 20)
+        return path
+
+    def assertFallback(self, tag_bytes, expected):
+        with self.assertRaises(id3_reader.UnsupportedTag):
+            id3_reader.read_id3(io.BytesIO(tag_bytes))
+
+        frames, info = extract_mp3.read_tags_and_info(self.mp3(tag_bytes))
+        self.assertEqual({name: frames.first_text(name) for name in expected}, expected)
+
+    def test_text_encodings(self):
+        data = tag(4, 0, ENCODED_FRAMES)
+        frames = id3_reader.read_id3(io.BytesIO(data))
+
+        self.assertEqual({name: frames.first_text(name) for name in TEXT}, TEXT)
+        self.assertEqual(frames.size, len(data))
+
+        tags = ID3(self.mp3(data))
+        self.assertEqual({name: str(tags[name]) for name in TEXT}, TEXT)
+
+    def test_unsynchronised_tag_falls_back_to_mutagen(self):
+        # v2.3 unsynchronisation inserts 00 after every FF; the text has none
+        body = v23_frame(b"TIT2", b"\x00Title") + v23_frame(b"TPE1", b"\x00Artist")
+        self.assertFallback(tag(3, 0x80, body), {"TIT2": "Title", "TPE1": "Artist"})
+
+    def test_v22_tag_falls_back_to_mutagen(self):
+        body = b"TT2" + struct.pack(">I", 6)[1:] + b"\x00Title" + b"TP1" + struct.pack(">I", 7)[1:] + b"\x00Artist"
+        self.assertFallback(tag(2, 0, body), {"TIT2": "Title", "TPE1": "Artist"})
+
+    def test_extended_header_falls_back_to_mutagen(self):
+        extended_header = syncsafe(6) + b"\x01\x00"
+        self.assertFallback(tag(4, 0x40, extended_header + ENCODED_FRAMES), TEXT)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,22 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import locality
+
+
+class ScheduleTest(unittest.TestCase):
+    def test_inode_order_reuses_listings(self):
+        folder = os.path.join(os.sep, "no", "such", "folder")
+        paths = [os.path.join(folder, name) for name in ("a.mp3", "b.mp3", "c.mp3")]
+        listings = {folder: (1, {"a.mp3": 30, "b.mp3": 10, "c.mp3": 20})}
+
+        with mock.patch("os.scandir", side_effect=AssertionError("folder listed again")):
+            self.assertEqual(locality.schedule(paths, "inode", listings), [1, 2, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+import base64
+import os
+import struct
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import markers2
+
+
+def entry(name, data):
+    return name + b"\x00" + struct.pack(">I", len(data)) + data
+
+
+def cue(index, position_ms, name, reserved=0):
+    return entry(b"CUE", struct.pack(">BBIBBBBH", 0, index, position_ms, 0, 0xCC, 0, 0, reserved) + name + b"\x00")
+
+
+def mp4_value(*entries):
+    payload = markers2.VERSION + base64.b64encode(markers2.VERSION + b"".join(entries) + b"\x00")
+    return base64.b64encode(markers2.MP4_MIME + b"\x00" + markers2.MP4_DESCRIPTION + payload)
+
+
+class Markers2Test(unittest.TestCase):
+    def test_mp4_skips_malformed_cue(self):
+        value = mp4_value(cue(0, 1000, b"good"), cue(1, 2000, b"bad", reserved=0x0101),
+                          entry(b"CUE", b""), cue(2, 3000, b""))
+        cues = markers2.from_mp4(value).cues
+        self.assertEqual([(c.index, c.position_ms, c.name) for c in cues], [(0, 1000, "good"), (2, 3000, "")])
+
+
+if __name__ == "__main__":
+    unittest.main()
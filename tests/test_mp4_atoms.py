@@ -0,0 +1,83 @@
+import io
+import os
+import random
+import struct
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mutagen.mp4 import MP4
+
+import mp4_atoms
+from synthetic_library import build_m4a, make_track
+
+ART_SIZE = 512 * 1024
+MDAT_SIZE = 1024 * 1024
+
+
+class CountingFile(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def split_atoms(data):
+    position = 0
+    while position < len(data):
+        length = struct.unpack_from(">I", data, position)[0]
+        yield data[position + 4:position + 8], data[position + 8:position + length]
+        position += length
+
+
+def atom(name, payload):
+    return struct.pack(">I", len(payload) + 8) + name + payload
+
+
+def large_atom(name, payload):
+    # 64-bit size: length 1, then the real length after the name
+    return struct.pack(">I4sQ", 1, name, len(payload) + 16) + payload
+
+
+class MP4AtomsTest(unittest.TestCase):
+    def setUp(self):
+        self.track = make_track(random.Random(5), 1)
+        # mdat in front of moov, so the reader has to skip it to get to the tags
+        atoms = dict(split_atoms(build_m4a(self.track, ART_SIZE, 2.0)))
+        self.atoms = [(b"ftyp", atoms[b"ftyp"]), (b"mdat", bytes(MDAT_SIZE)), (b"moov", atoms[b"moov"])]
+        self.data = b"".join(atom(name, payload) for name, payload in self.atoms)
+
+    def assertMatchesMutagen(self, data):
+        atoms = mp4_atoms.read_mp4(io.BytesIO(data))
+        audio = MP4(io.BytesIO(data))
+
+        for key in ("\xa9nam", "\xa9ART", "tmpo", "----:com.apple.iTunes:initialkey",
+                    "----:com.serato.dj:markersv2", "----:com.serato.dj:beatgrid"):
+            self.assertEqual(atoms.get(key), audio.get(key), key)
+
+        self.assertAlmostEqual(atoms.length, audio.info.length)
+        self.assertEqual(atoms.sample_rate, audio.info.sample_rate)
+
+    def test_64_bit_atom_sizes(self):
+        data = b"".join((atom if name == b"ftyp" else large_atom)(name, payload) for name, payload in self.atoms)
+        self.assertMatchesMutagen(data)
+
+    def test_skips_covr_and_mdat(self):
+        self.assertMatchesMutagen(self.data)
+
+        f = CountingFile(self.data)
+        atoms = mp4_atoms.read_mp4(f)
+
+        self.assertNotIn("covr", atoms.tags)
+        self.assertEqual(atoms.get("\xa9nam"), [self.track["title"]])
+        # cover art and mdat alone are 1.5 MB; tags and headers are a few KB
+        self.assertLess(f.bytes_read, 16 * 1024)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from path_resolver import PathResolver
+
+
+class FindMovedTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.search = os.path.join(self.root, "search")
+        os.makedirs(os.path.join(self.search, "a"))
+        os.makedirs(os.path.join(self.search, "b"))
+        self.missing = os.path.join(self.root, "gone", "01 Intro.mp3")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, folder, size):
+        path = os.path.join(self.search, folder, "01 Intro.mp3")
+        with open(path, "wb") as f:
+            f.write(b"\x00" * size)
+        return path
+
+    def resolve(self, size):
+        resolver = PathResolver(search_folders=[self.search])
+        return resolver.resolve(self.missing, lambda path: size), resolver
+
+    def test_unique_name_with_other_size_stays_missing(self):
+        self.write("a", 10)
+        resolved, resolver = self.resolve(20)
+        self.assertEqual(resolved, self.missing)
+        self.assertIn(self.missing, resolver.missing)
+
+    def test_unique_name_with_stored_size(self):
+        found = self.write("a", 10)
+        self.assertEqual(self.resolve(10)[0], found)
+
+    def test_unique_name_without_stored_size(self):
+        found = self.write("a", 10)
+        self.assertEqual(self.resolve(None)[0], found)
+
+    def test_size_settles_shared_name(self):
+        self.write("a", 10)
+        found = self.write("b", 20)
+        self.assertEqual(self.resolve(20)[0], found)
+        self.assertEqual(self.resolve(None)[0], self.missing)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import io
+import os
+import random
+import struct
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mutagen.wave import WAVE
+
+import extract_wav
+import riff_reader
+from synthetic_library import id3_tag, make_track
+
+
+def chunk(chunk_id, data):
+    # odd-sized chunks are followed by a pad byte that their size leaves out
+    return chunk_id + struct.pack("<I", len(data)) + data + b"\x00" * (len(data) & 1)
+
+
+class RiffReaderTest(unittest.TestCase):
+    def test_odd_sized_chunks(self):
+        track = make_track(random.Random(7), 1)
+        fmt = struct.pack("<HHIIHH", 1, 2, 44100, 44100 * 4, 4, 16)
+        tag = id3_tag(track, 1001)
+        if not len(tag) % 2:
+            tag += b"\x00"
+
+        body = (b"WAVE" + chunk(b"LIST", b"INFOodd") + chunk(b"fmt ", fmt)
+                + chunk(b"junk", b"\x01\x02\x03") + chunk(b"data", bytes(44100 * 4 // 2 + 3 * 4))
+                + chunk(b"id3 ", tag))
+        data = b"RIFF" + struct.pack("<I", len(body)) + body
+        audio = WAVE(io.BytesIO(data))
+
+        info = riff_reader.scan_wave(io.BytesIO(data))
+        self.assertEqual((info.channels, info.sample_rate, info.bits_per_sample),
+                         (audio.info.channels, audio.info.sample_rate, audio.info.bits_per_sample))
+        self.assertAlmostEqual(info.length, audio.info.length)
+        self.assertEqual(info.id3_size, len(tag))
+
+        frames, info = extract_wav.read_tags_and_info(io.BytesIO(data))
+        self.assertEqual(frames.first_text("TIT2"), str(audio.tags["TIT2"]))
+        self.assertEqual(frames.geob["Serato BeatGrid"], audio.tags.getall("GEOB")[-1].data)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import serato2rekordbox
+import serato_crate
+from synthetic_library import crate_bytes, tlv, utf16
+
+PATHS = ["music/a.mp3", "music/b.mp3", "music/c.mp3"]
+
+
+class SeratoCrateTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.crate_path = os.path.join(self.root, "Test.crate")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def read(self, data):
+        with open(self.crate_path, "wb") as f:
+            f.write(data)
+
+        errors = []
+        paths = serato2rekordbox.extract_file_paths_from_crate(self.crate_path, errors=errors)
+        return paths, [error["type"] for error in errors]
+
+    def test_header(self):
+        with open(self.crate_path, "wb") as f:
+            f.write(crate_bytes(PATHS))
+
+        with serato_crate.CrateFile.open(self.crate_path) as crate:
+            self.assertEqual(crate.version, "1.0/Serato ScratchLive Crate")
+            self.assertEqual((crate.sort_column, crate.sort_reverse), ("song", False))
+            self.assertEqual([name for name, width in crate.columns], ["song", "artist", "bpm", "key"])
+            self.assertEqual(list(crate.iter_paths()), PATHS)
+
+    def test_truncated_otrk(self):
+        # the file ends inside the last otrk record
+        self.assertEqual(self.read(crate_bytes(PATHS)[:-5]), (PATHS[:2], ["crate_parse_error"]))
+
+    def test_truncated_ptrk(self):
+        # a ptrk whose length runs past the end of its otrk
+        ptrk = tlv(b"ptrk", utf16(PATHS[2]))
+        broken = tlv(b"otrk", ptrk[:4] + struct.pack(">I", len(ptrk)) + ptrk[8:])
+        self.assertEqual(self.read(crate_bytes(PATHS[:2]) + broken), (PATHS[:2], ["crate_parse_error"]))
+
+    def test_undecodable_path(self):
+        # odd-length UTF-16 is skipped and reported, the paths around it are kept
+        data = crate_bytes(PATHS[:1]) + b"".join(tlv(b"otrk", tlv(b"ptrk", value))
+                                                 for value in [utf16("music/x.mp3") + b"\x00"] + [utf16(path) for path in PATHS[1:]])
+        self.assertEqual(self.read(data), (PATHS, ["crate_decode_error"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
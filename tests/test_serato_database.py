@@ -0,0 +1,78 @@
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import unittest
+from xml.etree import ElementTree
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import serato2rekordbox
+import serato_database
+from synthetic_library import generate_library, tlv, utf16
+
+
+def track_record(path, length=None):
+    fields = tlv(b"pfil", utf16(path)) + tlv(b"tsng", utf16("Title")) + tlv(b"uadd", struct.pack(">I", 1))
+    if length is not None:
+        fields += tlv(b"tlen", utf16(length))
+    return tlv(b"otrk", fields)
+
+
+class SeratoDatabaseTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write_database(self, folder, records):
+        with open(os.path.join(folder, serato_database.DATABASE_FILE), "wb") as f:
+            f.write(tlv(b"vrsn", utf16("2.0/Serato Scratch LIVE Database")) + b"".join(records))
+
+    def test_track_length(self):
+        lengths = {"a.mp3": "04:05.50", "b.mp3": "65:00.00", "c.mp3": "1:02:03.25",
+                   "d.mp3": "", "e.mp3": "n/a", "f.mp3": None}
+        self.write_database(self.root, [track_record("music/" + name, length) for name, length in lengths.items()])
+
+        tracks = serato_database.read_database(os.path.join(self.root, serato_database.DATABASE_FILE))
+        self.assertEqual({path: track["duration_sec"] for path, track in tracks.items()},
+                         {"/music/a.mp3": 245.5, "/music/b.mp3": 3900.0, "/music/c.mp3": 3723.25,
+                          "/music/d.mp3": 0, "/music/e.mp3": 0, "/music/f.mp3": 0})
+
+    def convert(self, serato_folder, name, **kwargs):
+        output_path = os.path.join(self.root, name)
+        serato2rekordbox.convert(serato_folder=serato_folder, output_path=output_path, cache_path=None,
+                                 metrics_path=os.path.join(self.root, "metrics.json"),
+                                 snapshot_path=os.path.join(self.root, "snapshot.json"), **kwargs)
+        # TRACK elements by location; the database gives TotalTime rounded
+        # to hundredths, so it is left out
+        tracks = {}
+        for track in ElementTree.parse(output_path).iter("TRACK"):
+            if "Location" in track.attrib:
+                attrib = dict(track.attrib)
+                del attrib["TotalTime"]
+                tracks[attrib["Location"]] = attrib, [ElementTree.tostring(child) for child in track]
+        return tracks
+
+    def test_tracks_missing_from_database(self):
+        # Tracks the database does not list are read from their files, so the
+        # collection comes out the same as without the database.
+        serato_folder = generate_library(os.path.join(self.root, "library"), 24, seed=4, art_size=64)
+        with open(os.path.join(serato_folder, serato_database.DATABASE_FILE), "rb") as f:
+            records = list(serato_database.iter_records(f))
+
+        tracks = [tlv(tag.encode("latin-1"), payload) for tag, payload in records if tag == "otrk"]
+        self.write_database(serato_folder, tracks[::2])
+
+        expected = self.convert(serato_folder, "files.xml")
+        self.assertGreater(len(expected), len(tracks) // 2)
+        self.assertEqual(self.convert(serato_folder, "database.xml", use_database=True), expected)
+
+        database = serato2rekordbox.load_database(serato_folder)
+        self.assertEqual(len(database), len(tracks[::2]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import json
+import os
+import sqlite3
+
+from records import TrackRecord
+
+# Bump whenever an extractor changes the shape or meaning of its output, so
+# records written by an older version are re-extracted instead of reused.
+CACHE_VERSION = 4
+DEFAULT_CACHE_FILE = "serato2rekordbox.cache.db"
+
+# Only deterministic failures are cached as negative entries; processing
+# errors can be transient (e.g. a network share hiccup) and are retried.
+NEGATIVE_ERROR_TYPES = ("file_not_found", "unsupported_format")
+
+MISSING_FILE_KEY = (-1, -1)
+
+# Full extractions and the hot cue/beatgrid-only extractions used with the
+# Serato database are different records for the same file, so they are kept apart.
+TABLES = ("tracks", "markers")
+
+
+def file_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return MISSING_FILE_KEY
+
+    return st.st_size, st.st_mtime_ns
+
+
+class TrackCache:
+    def __init__(self, db_path=DEFAULT_CACHE_FILE):
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        for table in TABLES:
+            self.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                " path TEXT PRIMARY KEY,"
+                " size INTEGER NOT NULL,"
+                " mtime_ns INTEGER NOT NULL,"
+                " version INTEGER NOT NULL,"
+                " record TEXT,"
+                " error TEXT)"
+            )
+            self.conn.execute(f"DELETE FROM {table} WHERE version != ?", (CACHE_VERSION,))
+        self.conn.commit()
+
+    def lookup(self, path, markers_only=False):
+        # Returns (key, entry); entry is the (track_data, error) pair of
+        # process_track()'s result, or None when the file must be (re)scanned.
+        key = file_key(path)
+        table = TABLES[markers_only]
+        row = self.conn.execute(
+            f"SELECT size, mtime_ns, record, error FROM {table} WHERE path = ?", (path,)
+        ).fetchone()
+
+        if row is None or (row[0], row[1]) != key:
+            self.misses += 1
+            return key, None
+
+        self.hits += 1
+
+        if row[3] is not None:
+            error = json.loads(row[3])
+            error['path'] = path
+            return key, (None, error)
+
+        track_data = TrackRecord.from_json(path, json.loads(row[2]))
+        return key, (track_data, None)
+
+    def store(self, path, key, track_data, error, markers_only=False):
+        table = TABLES[markers_only]
+
+        if error is not None:
+            if error.get('type') not in NEGATIVE_ERROR_TYPES:
+                self.conn.execute(f"DELETE FROM {table} WHERE path = ?", (path,))
+                return
+
+            record = None
+            error_json = json.dumps({k: v for k, v in error.items() if k != 'path'})
+        else:
+            record = json.dumps(track_data.to_json())
+            error_json = None
+
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO {table} (path, size, mtime_ns, version, record, error) VALUES (?, ?, ?, ?, ?, ?)",
+            (path, key[0], key[1], CACHE_VERSION, record, error_json)
+        )
+
+    def stored_size(self, path):
+        # The size the file had when it was last extracted, or None; lets
+        # path_resolver tell apart moved files that share a name.
+        for table in TABLES:
+            row = self.conn.execute(f"SELECT size FROM {table} WHERE path = ?", (path,)).fetchone()
+            if row is not None and row[0] >= 0:
+                return row[0]
+
+        return None
+
+    def evict_stale(self, live_paths):
+        # Drops every entry whose path is no longer referenced by any crate,
+        # plus entries whose file has changed or disappeared since they were stored.
+        live_paths = set(live_paths)
+        evicted = 0
+
+        for table in TABLES:
+            stale = []
+
+            for path, size, mtime_ns in self.conn.execute(f"SELECT path, size, mtime_ns FROM {table}"):
+                if path not in live_paths or file_key(path) != (size, mtime_ns):
+                    stale.append((path,))
+
+            self.conn.executemany(f"DELETE FROM {table} WHERE path = ?", stale)
+            evicted += len(stale)
+
+        self.conn.commit()
+        return evicted
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
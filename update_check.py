@@ -0,0 +1,115 @@
+import json
+import os
+import platform
+import threading
+import time
+
+README_URL = "https://raw.githubusercontent.com/BytePhoenixCoding/serato2rekordbox/main/README.md"
+PROJECT_URL = "https://github.com/BytePhoenixCoding/serato2rekordbox"
+REQUEST_TIMEOUT = 5
+CHECK_INTERVAL = 24 * 60 * 60   # seconds a result is reused before asking GitHub again
+CACHE_FILE_NAME = "update_check.json"
+
+
+def default_cache_path():
+    if platform.system() == "Windows":
+        base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), "AppData", "Local")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+
+    return os.path.join(base, "serato2rekordbox", CACHE_FILE_NAME)
+
+
+def load_cached_result(cache_path, current_version, now=None):
+    # The cached answer only counts for the version that asked and for one day.
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    now = time.time() if now is None else now
+
+    if cached.get("version") != current_version or not 0 <= now - cached.get("checked", 0) < CHECK_INTERVAL:
+        return None
+
+    return cached
+
+
+def save_result(cache_path, result):
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+
+
+def fetch_result(current_version):
+    # Imported here: urllib.request and ssl are among the slowest imports of
+    # the whole program and only this background thread needs them.
+    import ssl
+    import urllib.request
+
+    context = ssl._create_unverified_context()  # <- disable SSL verification
+    with urllib.request.urlopen(README_URL, timeout=REQUEST_TIMEOUT, context=context) as response:
+        content = response.read().decode('utf-8')
+
+    return {"version": current_version, "checked": time.time(), "up_to_date": current_version in content}
+
+
+class UpdateCheck:
+    # Runs the check in a daemon thread so the conversion never waits for the
+    # network; report() prints whatever is known by the time it is called.
+
+    def __init__(self, current_version, cache_path=None):
+        self.current_version = current_version
+        self.cache_path = cache_path or default_cache_path()
+        self.result = None
+        self.error = None
+        self.thread = None
+        self.reported = False
+
+    def start(self):
+        self.result = load_cached_result(self.cache_path, self.current_version)
+
+        if self.result is None:
+            self.thread = threading.Thread(target=self.run, name="update-check", daemon=True)
+            self.thread.start()
+
+        return self
+
+    def run(self):
+        try:
+            self.result = fetch_result(self.current_version)
+        except Exception as e:
+            self.error = e
+            return
+
+        save_result(self.cache_path, self.result)
+
+    def report(self, timeout=0):
+        # Prints the outcome once, as soon as there is one; waits at most timeout seconds.
+        if self.reported:
+            return
+
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+        if self.result is None:
+            if self.error is not None:
+                print(f"(Update check skipped: {self.error})")
+                self.reported = True
+            return
+
+        self.reported = True
+
+        if not self.result["up_to_date"]:
+            print("──────────────────────────────────────────────────────────")
+            print("⚠️ A new version of serato2rekordbox is available!")
+            print(f"🔗 Please update here: {PROJECT_URL}")
+            print("──────────────────────────────────────────────────────────\n")
+        else:
+            print("✅ serato2rekordbox is up to date.")
@@ -0,0 +1,300 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import platform
+import select
+import struct
+import time
+
+from serato_database import DATABASE_FILE
+
+# Watch mode: after a first conversion, wait for crates, the audio files they
+# reference (and with --use-database the database file) to change, then run an
+# incremental conversion, which re-reads only the changed crates and tracks.
+# Changes are collected until none arrive for DEBOUNCE seconds, so saving a
+# crate in Serato, which writes several files in a row, causes one rebuild.
+#
+# Linux uses inotify on the folders involved, so an idle watch costs nothing.
+# Elsewhere, and with --watch-poll (needed on network shares, where inotify
+# does not see changes made by other machines), the files are polled: crate
+# files every round, track files a slice at a time, so one round costs the
+# same however big the library is.
+
+DEBOUNCE = 2.0                  # seconds without a new change before rebuilding
+MAX_DELAY = 30.0                # rebuild at the latest this long after the first change
+POLL_INTERVAL = 2.0             # seconds between polling rounds
+POLL_FILES_PER_ROUND = 2000     # track files stat'ed per polling round
+
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+EVENT = struct.Struct("iIII")   # wd, mask, cookie, name length; the name follows
+READ_SIZE = 64 * 1024
+
+
+def watch_targets(serato_folder, track_paths, use_database=False):
+    # folder -> names to watch in it; None stands for every .crate file
+    targets = {os.path.join(serato_folder, "subcrates"): None}
+
+    if use_database:
+        targets[serato_folder] = {DATABASE_FILE}
+
+    for path in track_paths:
+        folder, name = os.path.split(path)
+        targets.setdefault(folder, set()).add(name)
+
+    return targets
+
+
+def is_watched(targets, folder, name):
+    names = targets.get(folder)
+    return name.endswith(".crate") if names is None else name in names
+
+
+def stat_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def scan_crates(folder):
+    # crate file path -> (size, mtime_ns)
+    crates = {}
+
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.name.endswith(".crate"):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    crates[entry.path] = (st.st_size, st.st_mtime_ns)
+    except OSError:
+        pass
+
+    return crates
+
+
+class InotifyWatcher:
+    name = "inotify"
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self.folders = {}       # watch descriptor -> folder
+        self.targets = {}
+
+    def watch(self, targets):
+        # Watches the folders in targets and stops watching the others. One
+        # watch per folder, not per file, keeps well inside the kernel's limit.
+        self.targets = targets
+        watched = set(self.folders.values())
+
+        for wd, folder in list(self.folders.items()):
+            if folder not in targets:
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.folders[wd]
+
+        for folder in targets:
+            if folder in watched:
+                continue
+
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOSPC:
+                    raise OSError(error, "inotify watch limit reached (see fs.inotify.max_user_watches)")
+                continue        # missing folder: its tracks are reported by the conversion
+
+            self.folders[wd] = folder
+
+    def wait(self, timeout=None):
+        # Changed paths; an empty set if nothing relevant happened within
+        # timeout seconds (None waits as long as it takes).
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        try:
+            data = os.read(self.fd, READ_SIZE)
+        except BlockingIOError:
+            return set()
+
+        changed = set()
+        position = 0
+
+        while position + EVENT.size <= len(data):
+            wd, mask, _, length = EVENT.unpack_from(data, position)
+            name = os.fsdecode(data[position + EVENT.size:position + EVENT.size + length].split(b"\x00", 1)[0])
+            position += EVENT.size + length
+            folder = self.folders.get(wd)
+
+            if mask & IN_Q_OVERFLOW:
+                changed.update(self.targets)            # events were lost; rebuild to be safe
+            elif folder is None:
+                continue
+            elif mask & IN_IGNORED:
+                del self.folders[wd]
+            elif mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                changed.add(folder)
+            elif is_watched(self.targets, folder, name):
+                changed.add(os.path.join(folder, name))
+
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingWatcher:
+    name = "polling"
+
+    def __init__(self, interval=POLL_INTERVAL, files_per_round=POLL_FILES_PER_ROUND):
+        self.interval = interval
+        self.files_per_round = files_per_round
+        self.crate_folders = {}     # crate folder -> scan_crates() result
+        self.files = {}             # track (or database) file -> stat_key()
+        self.rotation = []
+        self.cursor = 0
+
+    def watch(self, targets):
+        self.crate_folders = {folder: self.crate_folders.get(folder) or scan_crates(folder)
+                              for folder, names in targets.items() if names is None}
+
+        files = {}
+        for folder, names in targets.items():
+            for name in names or ():
+                path = os.path.join(folder, name)
+                files[path] = self.files[path] if path in self.files else stat_key(path)
+
+        self.files = files
+        self.rotation = list(files)
+        self.cursor = 0
+
+    def poll(self):
+        changed = set()
+
+        for folder, crates in self.crate_folders.items():
+            current = scan_crates(folder)
+            if current != crates:
+                changed.update(path for path in crates.keys() | current.keys() if crates.get(path) != current.get(path))
+                self.crate_folders[folder] = current
+
+        for _ in range(min(self.files_per_round, len(self.rotation))):
+            path = self.rotation[self.cursor]
+            self.cursor = (self.cursor + 1) % len(self.rotation)
+            key = stat_key(path)
+
+            if key != self.files[path]:
+                self.files[path] = key
+                changed.add(path)
+
+        return changed
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            delay = self.interval if deadline is None else min(self.interval, deadline - time.monotonic())
+            if delay <= 0:
+                return set()
+
+            time.sleep(delay)
+            changed = self.poll()
+            if changed:
+                return changed
+
+    def close(self):
+        pass
+
+
+def make_watcher(poll=False, interval=POLL_INTERVAL):
+    if not poll and platform.system() == "Linux":
+        try:
+            return InotifyWatcher()
+        except (OSError, AttributeError) as e:      # AttributeError: libc without inotify
+            print(f"⚠️ inotify is not available ({e}), polling for changes instead.")
+
+    return PollingWatcher(interval)
+
+
+def describe(changed):
+    crates = sum(1 for path in changed if path.endswith(".crate"))
+    others = len(changed) - crates
+    parts = [f"{count} {label}{'s' if count != 1 else ''}"
+             for count, label in ((crates, "crate"), (others, "other file")) if count]
+    return " and ".join(parts)
+
+
+def collect(watcher, debounce=DEBOUNCE, max_delay=MAX_DELAY):
+    # Blocks until something changes, then keeps collecting until there has
+    # been no change for debounce seconds (or max_delay has passed).
+    changed = set()
+    while not changed:
+        changed = watcher.wait()
+
+    first = last = time.monotonic()
+
+    while True:
+        remaining = min(last + debounce, first + max_delay) - time.monotonic()
+        if remaining <= 0:
+            return changed
+
+        more = watcher.wait(remaining)
+        if more:
+            changed |= more
+            last = time.monotonic()
+
+
+def run(convert, use_database=False, debounce=DEBOUNCE, poll=False, interval=POLL_INTERVAL, **convert_args):
+    # convert is serato2rekordbox.convert; it runs incrementally throughout.
+    summary = convert(incremental=True, use_database=use_database, **convert_args)
+
+    if not summary["serato_folder"]:
+        return summary
+
+    watcher = make_watcher(poll, interval)
+
+    try:
+        while True:
+            targets = watch_targets(summary["serato_folder"], summary["track_paths"], use_database)
+
+            try:
+                watcher.watch(targets)
+            except OSError as e:
+                print(f"⚠️ {e}; polling for changes instead.")
+                watcher.close()
+                watcher = PollingWatcher(interval)
+                watcher.watch(targets)
+
+            print(f"\n👀 Watching {len(targets)} folders for changes ({watcher.name}). Press Ctrl+C to stop.")
+            changed = collect(watcher, debounce)
+            print(f"\n🔄 {describe(changed)} changed, updating the XML.\n")
+            summary = convert(incremental=True, use_database=use_database, **convert_args)
+
+    except KeyboardInterrupt:
+        print("\n✅ Stopped watching.")
+
+    finally:
+        watcher.close()
+
+    return summary
@@ -0,0 +1,129 @@
+import mmap
+import re
+import tempfile
+
+# Characters that are not allowed anywhere in an XML 1.0 document.
+INVALID_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+
+def escape_attribute(value: str) -> str:
+    # Same escaping as xml.dom.minidom, so the output matches the old
+    # ElementTree + minidom.toprettyxml() writer byte for byte.
+    value = INVALID_XML_CHARS.sub("", value)
+    return value.replace("&", "&amp;").replace("<", "&lt;").replace("\"", "&quot;").replace(">", "&gt;")
+
+
+class XmlStreamWriter:
+    # Writes elements straight to a text file as they are produced, so memory
+    # use does not grow with the size of the document. The default layout is
+    # identical to minidom's toprettyxml(indent="  "); compact=True drops all
+    # indentation and newlines.
+
+    def __init__(self, f, compact: bool = False, indent: str = "  ", depth: int = 0, declaration: bool = True):
+        self.f = f
+        self.indent = "" if compact else indent
+        self.newline = "" if compact else "\n"
+        self.depth = depth
+        self.open_tags = []
+
+        if declaration:
+            f.write('<?xml version="1.0" ?>' + self.newline)
+
+    def _tag(self, tag, attrs, close):
+        parts = [self.indent * self.depth, "<", tag]
+
+        for name, value in attrs.items():
+            parts.append(f' {name}="{escape_attribute(value)}"')
+
+        parts.append(close)
+        parts.append(self.newline)
+        self.f.write("".join(parts))
+
+    def start(self, tag, **attrs):
+        self._tag(tag, attrs, ">")
+        self.open_tags.append(tag)
+        self.depth += 1
+
+    def empty(self, tag, **attrs):
+        self._tag(tag, attrs, "/>")
+
+    def end(self, tag):
+        open_tag = self.open_tags.pop()
+        if open_tag != tag:
+            raise ValueError(f"Closing <{tag}> while <{open_tag}> is open")
+
+        self.depth -= 1
+        self.f.write(f"{self.indent * self.depth}</{tag}>{self.newline}")
+
+    def element(self, tag, children=(), **attrs):
+        # children is a sequence of (tag, attrs) pairs written as empty elements.
+        if not children:
+            self.empty(tag, **attrs)
+            return
+
+        self.start(tag, **attrs)
+        for child_tag, child_attrs in children:
+            self.empty(child_tag, **child_attrs)
+        self.end(tag)
+
+    def close(self):
+        while self.open_tags:
+            self.end(self.open_tags[-1])
+
+
+class ElementSpool:
+    # Elements written before their position in the document and the value of
+    # their first attribute are known: the Rekordbox collection starts with
+    # its Entries count, and TrackIDs follow crate order, while tracks are
+    # serialized in whatever order extraction finishes them. Each element is
+    # written to an anonymous temporary file without that attribute, at the
+    # depth it will have in the document; write_to() copies the elements into
+    # the document in the requested order, adding the attribute, so only one
+    # (offset, end) pair per element is kept in memory.
+
+    def __init__(self, tag: str, attribute: str, depth: int, compact: bool = False):
+        self.tag = tag
+        self.attribute = attribute
+        self.file = tempfile.TemporaryFile()
+        self.position = 0
+        self.slots = {}         # key -> (offset, end) in self.file
+        self.parts = []         # the element being written
+        self.xml = XmlStreamWriter(self, compact=compact, depth=depth, declaration=False)
+        self.prefix = len(self.xml.indent * depth) + 1 + len(tag)     # up to the attribute
+
+    def write(self, text):
+        self.parts.append(text)
+
+    def add(self, key, children=(), **attrs):
+        self.xml.element(self.tag, children, **attrs)
+        data = "".join(self.parts).encode("utf-8")
+        self.parts.clear()
+
+        self.file.write(data)
+        self.slots[key] = (self.position, self.position + len(data))
+        self.position += len(data)
+
+    def write_to(self, xml, items):
+        # items: (key, attribute value) pairs in document order; xml must be
+        # at the depth the elements were written for.
+        if xml.depth != self.xml.depth:
+            raise ValueError(f"Spooled <{self.tag}> elements were written for depth {self.xml.depth}, not {xml.depth}")
+
+        self.file.flush()
+        if not self.position:
+            return      # nothing spooled (and an empty file cannot be mapped)
+
+        with mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for key, value in items:
+                start, end = self.slots[key]
+                text = data[start:end].decode("utf-8")
+                xml.f.write(f'{text[:self.prefix]} {self.attribute}="{escape_attribute(value)}"{text[self.prefix:]}')
+
+    def __contains__(self, key):
+        return key in self.slots
+
+    def __len__(self):
+        return len(self.slots)
+
+    def close(self):
+        self.file.close()